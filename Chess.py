@@ -1,8 +1,18 @@
 #imports
-import pygame as p
+#pygame and pyttsx3 are only imported when main() starts the UI, so the engine and AI can be imported without a display or audio device
+#numpy is only imported by the batch evaluation, the engine and AI don't need it
 import random 
-from multiprocessing import Process, Queue
-import pyttsx3
+import time
+import atexit
+import os
+import mmap
+import pickle
+import struct
+from array import array
+from multiprocessing import Process, Pipe, Pool, Value, RawValue
+from multiprocessing import TimeoutError as PoolTimeoutError
+p = None #pygame, set by main()
+np = None #numpy, set the first time positions are scored in a batch
 
 # Constants
 BOARD_WIDTH = BOARD_HEIGHT = 512 #size pf the chess board itself
@@ -11,6 +21,7 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT # height of the move log panel, same as the
 DIMENSION = 8 #board length and width the number of squares in each row and column
 SQ_SIZE = BOARD_HEIGHT // DIMENSION #the size of each square
 MAX_FPS = 15 #frame rates
+BITBOARD_ENGINE = True #True to use the bitboard backed GameState, False for the original 8x8 board version
 IMAGES = {} #Holding for the images
 
 
@@ -18,7 +29,8 @@ IMAGES = {} #Holding for the images
 #---------------------------------------------------------------------------------------------------------------------------------
 # Class definition for GameState
 class GameState():
-    def __init__(self):
+    #fen is an optional FEN string of the position to start from, the normal starting position is used without one
+    def __init__(self, fen=None):
         # Board setup and other initialization
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -30,6 +42,7 @@ class GameState():
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
         self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N':self.getKnightMoves, 'B':self.getBishopMoves, 'Q':self.getQueenMoves, 'K':self.getKingMoves}
+        self.capturesOnly = False #True while the move functions should only add captures
 
         self.whiteToMove = True #True if it's white's turn to move, Flase if it is black's turn to move
         self.moveLog = [] #An array of all the moves
@@ -42,6 +55,103 @@ class GameState():
         self.enpassantPossibleLog = [self.enpassantPossible] #Saves the coordinates of the last possible enpassant move mainly for undoing moves
         self.currentCastlingRight = CastleRights(True, True, True, True) #Checks if the kings can castling on king and/or queens side
         self.castleRigthsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs,self.currentCastlingRight.bqs)]
+        self.halfmoveClock = 0 #moves since the last capture or pawn move, for the fifty move rule
+        self.halfmoveClockLog = [self.halfmoveClock] #Saves the clock before every move, mainly for undoing moves
+        self.fullmoveNumber = 1 #starts at 1 and goes up after every black move
+        self.pieceCount = 32 #pieces on the board, kings included, so the AI knows when the endgame tablebases apply
+        self.zobristKey = self.computeZobristKey() #64 bit number that identifies the position, updated by every move
+        self.zobristKeyLog = [self.zobristKey] #Saves the key of every position in the game, mainly for undoing moves
+        self.positionCounts = {self.zobristKey: 1} #how many times each position (zobrist key) was reached, for draws by repetition
+        self.positionCountsLog = [] #the counts from before every null move that hasn't been undone
+        self.boardScore = scorePieces(self.board) #material and position score (positive is good for white), updated by every move
+        self.boardScoreLog = [self.boardScore] #Saves the score of every position in the game, mainly for undoing moves
+        if fen is not None:
+            GameState.loadFen(self, fen)#subclasses build anything extra from the board after this returns
+
+    #set up the position from a FEN string, e.g. "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    #clears the move log, so the loaded position is the start of the game
+    def loadFen(self, fen):
+        fields = fen.split()
+        self.board = []
+        for rank in fields[0].split('/'):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))#that many empty squares
+                else:
+                    row.append(('w' if char.isupper() else 'b') + ('p' if char in "pP" else char.upper()))
+            self.board.append(row)
+        if len(self.board) != 8 or any(len(row) != 8 for row in self.board):
+            raise ValueError("Invalid FEN board: " + fields[0])
+        for square in ("wK", "bK"):#the move generators need exactly one king of each color
+            if sum(row.count(square) for row in self.board) != 1:
+                raise ValueError("Invalid FEN board, it needs exactly one king of each color: " + fields[0])
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == "wK":
+                    self.whiteKingLocation = (r, c)
+                elif self.board[r][c] == "bK":
+                    self.blackKingLocation = (r, c)
+        if len(fields) > 1 and fields[1] not in ('w', 'b'):
+            raise ValueError("Invalid FEN side to move, it has to be w or b: " + fields[1])
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else "-"
+        #a castling right only counts if the king and that rook are still on their starting squares
+        board = self.board
+        whiteKingHome = board[7][4] == "wK"
+        blackKingHome = board[0][4] == "bK"
+        self.currentCastlingRight = CastleRights('K' in castling and whiteKingHome and board[7][7] == "wR",
+                                                 'k' in castling and blackKingHome and board[0][7] == "bR",
+                                                 'Q' in castling and whiteKingHome and board[7][0] == "wR",
+                                                 'q' in castling and blackKingHome and board[0][0] == "bR")
+        self.castleRigthsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs,self.currentCastlingRight.bqs)]
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        if enpassant != "-" and (len(enpassant) != 2 or enpassant[0] not in Move.filesToCols or enpassant[1] not in "36"):
+            raise ValueError("Invalid FEN en passant square: " + enpassant)
+        self.enpassantPossible = () if enpassant == "-" else (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.pieceCount = sum(square != "--" for row in self.board for square in row)
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        self.positionCounts = {self.zobristKey: 1}
+        self.positionCountsLog = []
+        self.boardScore = scorePieces(self.board)
+        self.boardScoreLog = [self.boardScore]
+
+    #pickled copies (e.g. for the parallel search pool) leave out the timed methods of startProfiling, they can't be pickled
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in PROFILED_METHODS:
+            state.pop(name, None)
+        return state
+
+    #FEN string of the current position, the same format loadFen reads
+    def getFen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty > 0:
+                    rank += str(empty)
+                    empty = 0
+                rank += square[1].lower() if square[0] == 'b' else square[1].upper()
+            if empty > 0:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.currentCastlingRight
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        enpassant = "-" if self.enpassantPossible == () else Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        return " ".join(("/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enpassant, str(self.halfmoveClock), str(self.fullmoveNumber)))
 
     #takes a mve and excetutes it (will not work for castling, pawn promotion, and enpassant)
     def makeMove(self, move):
@@ -80,10 +190,28 @@ class GameState():
 
         self.enpassantPossibleLog.append(self.enpassantPossible)
 
+        #move counters, the clock starts again on captures and pawn moves
+        if move.pieceMoved[1] == 'p' or move.isCapture:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.whiteToMove:#black just moved
+            self.fullmoveNumber += 1
+        if move.isCapture:
+            self.pieceCount -= 1
+
         #update castling rights - whenever king or rook move
         self.updateCastleRights(move)
         self.castleRigthsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs,self.currentCastlingRight.bqs))
 
+        #update the zobrist key with only the squares and rights the move changed
+        self.zobristKey = self.updateZobristKey(self.zobristKey, move)
+        self.zobristKeyLog.append(self.zobristKey)
+        self.positionCounts[self.zobristKey] = self.positionCounts.get(self.zobristKey, 0) + 1
+        #update the score with only the pieces the move changed
+        self.boardScore = self.updateBoardScore(self.boardScore, move)
+        self.boardScoreLog.append(self.boardScore)
 
     #undo the last move made
     def undoMove(self):
@@ -105,12 +233,30 @@ class GameState():
 
             self.enpassantPossibleLog.pop()
             self.enpassantPossible = self.enpassantPossibleLog[-1]
+            #undo move counters
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if not self.whiteToMove:#a black move was undone
+                self.fullmoveNumber -= 1
+            if move.isCapture:
+                self.pieceCount += 1
             
 
             #undo castling rights
             self.castleRigthsLog.pop() #get rid of new calstle rights
             newRights = self.castleRigthsLog[-1] #set the current castle rights to the last one in the list
             self.currentCastlingRight = CastleRights(newRights.wks, newRights.bks, newRights.wqs, newRights.bqs)
+            #undo zobrist key and the count of the position being left
+            count = self.positionCounts[self.zobristKey] - 1
+            if count == 0:
+                del self.positionCounts[self.zobristKey]
+            else:
+                self.positionCounts[self.zobristKey] = count
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            #undo board score
+            self.boardScoreLog.pop()
+            self.boardScore = self.boardScoreLog[-1]
             #undo castle move
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:#kingside
@@ -123,6 +269,46 @@ class GameState():
             self.checkMate = False
             self.staleMate = False
 
+    #pass the turn without moving, for the null move pruning in the search, undone with undoNullMove
+    def makeNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enpassantPossible != ():#the chance to take en passant is gone after any move
+            self.zobristKey ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(self.enpassantPossible)
+        self.zobristKeyLog.append(self.zobristKey)
+        #passing isn't a legal move, so a position after it can't repeat one from before it
+        self.positionCountsLog.append(self.positionCounts)
+        self.positionCounts = {self.zobristKey: 1}
+
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.zobristKeyLog.pop()
+        self.zobristKey = self.zobristKeyLog[-1]
+        self.positionCounts = self.positionCountsLog.pop()
+        self.checkMate = False
+        self.staleMate = False
+
+    #True if the current position was reached at least times times, counting this time
+    def isRepetition(self, times=3):
+        return self.positionCounts[self.zobristKey] >= times
+
+    #50 moves by each side without a capture or pawn move, unless the last of them was checkmate
+    def isFiftyMoveDraw(self):
+        return self.halfmoveClock >= 100 and not self.checkMate
+
+    #True if the side to move has a piece other than pawns and the king, with only pawns passing can be the best move (zugzwang)
+    def hasNonPawnMaterial(self):
+        color = 'w' if self.whiteToMove else 'b'
+        for row in self.board:
+            for square in row:
+                if square[0] == color and square[1] != 'p' and square[1] != 'K':
+                    return True
+        return False
+
     #update the castle rights given the move
     def updateCastleRights(self, move):
         #Checks if the kings or rooks have moved and changes the castling rights accordinly
@@ -160,39 +346,178 @@ class GameState():
                     self.currentCastlingRight.bks = False
 
 
+    #the zobrist key of the current position computed from scratch
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    key ^= ZOBRIST_PIECES[self.board[r][c]][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= zobristCastleKey(self.currentCastlingRight)
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    #key of the position after move, from the key before it, called at the end of makeMove
+    #every piece, right and en passant file that changed is xor'ed out of the key and the new one xor'ed in
+    def updateZobristKey(self, key, move):
+        endSquare = move.endRow * 8 + move.endCol
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRow * 8 + move.startCol]
+        key ^= ZOBRIST_PIECES[move.pieceMoved[0] + 'Q' if move.isPawnPromotion else move.pieceMoved][endSquare]
+        if move.isEnpassantMove:
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][endSquare]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2:#kingside
+                key ^= ZOBRIST_PIECES[rook][endSquare + 1] ^ ZOBRIST_PIECES[rook][endSquare - 1]
+            else:#queenside
+                key ^= ZOBRIST_PIECES[rook][endSquare - 2] ^ ZOBRIST_PIECES[rook][endSquare + 1]
+        key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= zobristCastleKey(self.castleRigthsLog[-2]) ^ zobristCastleKey(self.currentCastlingRight)
+        if self.enpassantPossibleLog[-2] != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossibleLog[-2][1]]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    #score of the position after move, from the score before it, takes the moved (or promoted) piece,
+    #the captured piece (en passant too) and the castling rook off their old squares and onto the new ones
+    def updateBoardScore(self, score, move):
+        scores = PIECE_SQUARE_SCORES
+        endSquare = move.endRow * 8 + move.endCol
+        score -= scores[move.pieceMoved][move.startRow * 8 + move.startCol]
+        score += scores[move.pieceMoved[0] + 'Q' if move.isPawnPromotion else move.pieceMoved][endSquare]
+        if move.isEnpassantMove:
+            score -= scores[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            score -= scores[move.pieceCaptured][endSquare]
+        if move.isCastleMove:
+            rook = scores[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2:#kingside
+                score += rook[endSquare - 1] - rook[endSquare + 1]
+            else:#queenside
+                score += rook[endSquare + 1] - rook[endSquare - 2]
+        return score
+
     #all moves considering checks
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        tempCastlingRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs,self.currentCastlingRight.bqs)
-        #1 generate all possible moves
-        moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        #2 for each move make move
-        for i in range(len(moves)-1, -1, -1):# when removing from list start at back
-            self.makeMove(moves[i])
-            #3 generate all oppenents moves
-            #4 for each of your opponents mvoes see if they attack your king
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i]) #5 if they do attack your king, not a valid move
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        moves, inCheck = self.getLegalMoves()
+        if not inCheck:
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            self.getCastleMoves(kingRow, kingCol, moves)
 
         #If the number of valid moves is 0 then the game is in either checkmate or stalemate
         if len(moves) == 0:
-            if self.inCheck():
+            if inCheck:
                 self.checkMate = True
             else:
                 self.staleMate = True
 
-        self.enpassantPossible = tempEnpassantPossible
-        self.currentCastlingRight = tempCastlingRights
-       
         return moves
 
+    #only the legal captures, for the quiescence search, doesn't set checkMate or staleMate
+    def getValidCaptures(self):
+        self.capturesOnly = True
+        moves = self.getLegalMoves()[0]
+        self.capturesOnly = False
+        return moves
+
+    #the legal moves without castling, returns (moves, inCheck)
+    def getLegalMoves(self):
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        #1 find the pins and the pieces checking the king, looking out from the king only once
+        inCheck, pins, checks = self.checkForPinsAndChecks(kingRow, kingCol)
+        #2 if there is one check the other pieces have to capture the checking piece or block the line to the king
+        validSquares = None
+        if len(checks) == 1:
+            checkRow, checkCol, dr, dc = checks[0]
+            validSquares = {(checkRow, checkCol)}
+            if self.board[checkRow][checkCol][1] != 'N':#knights can't be blocked
+                for i in range(1, 8):
+                    if (kingRow + dr * i, kingCol + dc * i) == (checkRow, checkCol):
+                        break
+                    validSquares.add((kingRow + dr * i, kingCol + dc * i))
+        #3 keep the possible moves that don't leave the king under attack
+        moves = []
+        for move in self.getAllPossibleMoves():
+            if move.pieceMoved[1] == 'K':
+                #lift the king off the board so it can't hide behind itself when it moves away from a sliding piece
+                self.board[kingRow][kingCol] = "--"
+                attacked = self.squareUnderAttack(move.endRow, move.endCol)
+                self.board[kingRow][kingCol] = move.pieceMoved
+                if attacked:
+                    continue#the king would walk into an attack
+            elif len(checks) > 1:
+                continue#double check, only the king can move
+            else:
+                if validSquares is not None and (move.endRow, move.endCol) not in validSquares:
+                    #taking the checking pawn en passant lands next to it instead of on it
+                    if not (move.isEnpassantMove and (move.startRow, move.endCol) == (checks[0][0], checks[0][1])):
+                        continue
+                if (move.startRow, move.startCol) in pins:
+                    #a pinned piece can only move along the line between the king and the pinning piece
+                    dr, dc = pins[(move.startRow, move.startCol)]
+                    if dr * (move.endCol - kingCol) != dc * (move.endRow - kingRow):
+                        continue
+                if move.isEnpassantMove and self.enpassantExposesKing(move, kingRow, kingCol):
+                    continue
+            moves.append(move)
+        return moves, inCheck
+
+    #looks outward from the square r,c along every line an enemy piece could attack it from
+    #returns (inCheck, pins, checks), pins maps the square of a pinned ally piece to the direction of the pin
+    #checks is a list of (row, col, dirRow, dirCol) for every enemy piece attacking r,c
+    #the ally king is treated as an empty square so it can't hide behind itself when it moves away from a sliding piece
+    def checkForPinsAndChecks(self, r, c):
+        pins = {}
+        checks = []
+        allyColor = "w" if self.whiteToMove else "b"
+        enemyColor = "b" if self.whiteToMove else "w"
+        pawnDirection = -1 if enemyColor == 'b' else 1 #an enemy pawn attacks from the row on this side of the square
+        rays = RAY_TARGETS[r * 8 + c]
+        for j in range(8):
+            d = DIRECTIONS[j]
+            possiblePin = None
+            for i, (endRow, endCol) in enumerate(rays[j], 1):
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != 'K':
+                    if possiblePin is None:#first ally piece could be pinned
+                        possiblePin = (endRow, endCol)
+                    else:#second ally piece, no pin or check possible in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    #orthogonal rook, diagonal bishop, queen in any direction, king one square away
+                    #and a pawn one square diagonally in front of the square (towards the enemy side)
+                    if (j <= 3 and pieceType == 'R') or (j >= 4 and pieceType == 'B') or pieceType == 'Q' or \
+                            (i == 1 and pieceType == 'K') or (i == 1 and pieceType == 'p' and j >= 4 and d[0] == pawnDirection):
+                        if possiblePin is None:#nothing in the way, so check
+                            checks.append((endRow, endCol, d[0], d[1]))
+                        else:#ally piece in the way, so pin
+                            pins[possiblePin] = d
+                    break#enemy piece is in the way of anything further
+        #knight checks
+        for endRow, endCol in KNIGHT_TARGETS[r * 8 + c]:
+            if self.board[endRow][endCol] == enemyColor + 'N':
+                checks.append((endRow, endCol, endRow - r, endCol - c))
+        return len(checks) > 0, pins, checks
+
+    #an en passant capture takes two pawns off the same row, which can open that row up to the king
+    def enpassantExposesKing(self, move, kingRow, kingCol):
+        self.board[move.startRow][move.startCol] = "--"
+        self.board[move.startRow][move.endCol] = "--"
+        self.board[move.endRow][move.endCol] = move.pieceMoved
+        exposed = self.checkForPinsAndChecks(kingRow, kingCol)[0]
+        #put the pawns back
+        self.board[move.startRow][move.startCol] = move.pieceMoved
+        self.board[move.startRow][move.endCol] = move.pieceCaptured
+        self.board[move.endRow][move.endCol] = "--"
+        return exposed
+
     #determine if the current player is in check
     def inCheck(self):
         if self.whiteToMove:
@@ -201,15 +526,70 @@ class GameState():
             return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
     
     #determine if the enemy can attack the square r,c
+    #looks outward from r,c along knight, pawn, king and sliding lines, each line stops at the first piece in the way
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove#switch turns back
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:#square under attack!
+        enemyColor = "b" if self.whiteToMove else "w"
+        board = self.board
+        square = r * 8 + c
+        #knights
+        for endRow, endCol in KNIGHT_TARGETS[square]:
+            if board[endRow][endCol] == enemyColor + 'N':
+                return True
+        #pawns attack from one row closer to their own side
+        pawnRow = r - 1 if enemyColor == 'b' else r + 1
+        if 0 <= pawnRow < 8:
+            if c - 1 >= 0 and board[pawnRow][c-1] == enemyColor + 'p':
+                return True
+            if c + 1 <= 7 and board[pawnRow][c+1] == enemyColor + 'p':
                 return True
+        #king
+        for endRow, endCol in KING_TARGETS[square]:
+            if board[endRow][endCol] == enemyColor + 'K':
+                return True
+        #sliding pieces, rooks on the first 4 directions and bishops on the last 4
+        rays = RAY_TARGETS[square]
+        for j in range(8):
+            slider = 'R' if j <= 3 else 'B'
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece != "--":
+                    if endPiece[0] == enemyColor and (endPiece[1] == slider or endPiece[1] == 'Q'):
+                        return True
+                    break#blocked
         return False
 
+    #returns the set of (row, col) squares the enemy attacks, all at once
+    #used when several squares have to be checked, like the squares the king passes over when castling
+    def getAttackedSquares(self):
+        attacked = set()
+        enemyColor = "b" if self.whiteToMove else "w"
+        board = self.board
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != enemyColor:
+                    continue
+                pieceType = piece[1]
+                square = r * 8 + c
+                if pieceType == 'p':
+                    pawnRow = r + 1 if enemyColor == 'b' else r - 1
+                    if c - 1 >= 0:
+                        attacked.add((pawnRow, c - 1))
+                    if c + 1 <= 7:
+                        attacked.add((pawnRow, c + 1))
+                elif pieceType == 'N':
+                    attacked.update(KNIGHT_TARGETS[square])
+                elif pieceType == 'K':
+                    attacked.update(KING_TARGETS[square])
+                else:
+                    rays = RAY_TARGETS[square] if pieceType == 'Q' else ROOK_RAY_TARGETS[square] if pieceType == 'R' else BISHOP_RAY_TARGETS[square]
+                    for ray in rays:
+                        for endRow, endCol in ray:
+                            attacked.add((endRow, endCol))
+                            if board[endRow][endCol] != "--":#the ray stops at the first piece
+                                break
+        return attacked
+
     #gets all the possible moves by the piece without considering if the king is in check or not
     def getAllPossibleMoves(self):
         moves = []
@@ -225,7 +605,7 @@ class GameState():
     #Get all pawn moves for the pawn at the specfic square on the board
     def getPawnMoves(self, r, c, moves):
         if self.whiteToMove:# white pawns moves
-            if self.board[r-1][c] == "--":#1square pawn advance
+            if self.board[r-1][c] == "--" and not self.capturesOnly:#1square pawn advance
                 moves.append(Move((r, c) , (r-1,c), self.board))
                 if r == 6  and self.board[r-2][c] == "--":
                     moves.append(Move((r, c) , (r-2,c), self.board))
@@ -240,7 +620,7 @@ class GameState():
                 elif (r-1, c+1) == self.enpassantPossible:
                     moves.append(Move((r, c) , (r-1,c+1), self.board, isEnpassantMove=True))
         else:# black pawns moves
-            if self.board[r+1][c] == "--":#1square pawn advance
+            if self.board[r+1][c] == "--" and not self.capturesOnly:#1square pawn advance
                 moves.append(Move((r, c) , (r+1,c), self.board))
                 if r == 1  and self.board[r+2][c] == "--":
                     moves.append(Move((r, c) , (r+2,c), self.board))
@@ -258,55 +638,41 @@ class GameState():
 
     #Get all rook moves for the rook at the specfic square on the board
     def getRookMoves(self, r, c, moves):
-        directions = ((-1,0),(0,-1),(1,0),(0,1))#up, left, down, right
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1,8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":#endpy space valid
-                        moves.append(Move((r, c) , (endRow, endCol), self.board))
-                    elif (endPiece[0] == enemyColor):#enemy piece valid
+        for ray in ROOK_RAY_TARGETS[r * 8 + c]:#up, left, down, right
+            for endRow, endCol in ray:
+                endPiece = self.board[endRow][endCol]
+                if endPiece == "--":#endpy space valid
+                    if not self.capturesOnly:
                         moves.append(Move((r, c) , (endRow, endCol), self.board))
-                        break
-                    else:
-                        break
-                else:#off board
+                elif (endPiece[0] == enemyColor):#enemy piece valid
+                    moves.append(Move((r, c) , (endRow, endCol), self.board))
+                    break
+                else:
                     break
 
 
     #Get all Knight moves for the Knight at the specfic square on the board
     def getKnightMoves(self, r, c, moves):
-        knightMoves = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))#up, left, down, right
         allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0] 
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:#not an ally piece (empty or enemy)
-                    moves.append(Move((r, c) , (endRow,endCol), self.board))
+        for endRow, endCol in KNIGHT_TARGETS[r * 8 + c]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] != allyColor and not (self.capturesOnly and endPiece == "--"):#not an ally piece (empty or enemy)
+                moves.append(Move((r, c) , (endRow,endCol), self.board))
 
 
     #Get all Bishop moves for the Bishop at the specfic square on the board
     def getBishopMoves(self, r, c, moves):
-        directions = ((-1,-1),(1,-1),(1,1),(-1,1))#up, left, down, right
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1,8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":#endpy space valid
-                        moves.append(Move((r, c) , (endRow,endCol), self.board))
-                    elif (endPiece[0] == enemyColor):#enemy piece valid
+        for ray in BISHOP_RAY_TARGETS[r * 8 + c]:
+            for endRow, endCol in ray:
+                endPiece = self.board[endRow][endCol]
+                if endPiece == "--":#endpy space valid
+                    if not self.capturesOnly:
                         moves.append(Move((r, c) , (endRow,endCol), self.board))
-                        break
-                    else:
-                        break
+                elif (endPiece[0] == enemyColor):#enemy piece valid
+                    moves.append(Move((r, c) , (endRow,endCol), self.board))
+                    break
                 else:
                     break
 
@@ -320,41 +686,46 @@ class GameState():
 
     #Get all king moves for the king at the specfic square on the board
     def getKingMoves(self, r, c, moves):
-        kingMoves = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
         allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + kingMoves[i][0] 
-            endCol = c + kingMoves[i][1] 
-            if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    moves.append(Move((r, c) , (endRow,endCol), self.board))
+        for endRow, endCol in KING_TARGETS[r * 8 + c]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] != allyColor and not (self.capturesOnly and endPiece == "--"):
+                moves.append(Move((r, c) , (endRow,endCol), self.board))
         
 
     #generate all valid castle movs for the king at (r,c ) and add them to the list of moves
     def getCastleMoves(self, r, c, moves):
-        if self.squareUnderAttack(r, c):
+        kingside = ((self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks)) and \
+            self.board[r][c+1] == '--' and self.board[r][c+2] == '--'
+        queenside = ((self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs)) and \
+            self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--'
+        if not kingside and not queenside:
+            return
+        attackedSquares = self.getAttackedSquares()#one attack map for every square the king stands on or passes over
+        if (r, c) in attackedSquares:
             return#cant castle white we are in check
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
-            self.getKingsideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
-            self.getQueensideCastleMoves(r, c, moves)
+        if kingside:
+            self.getKingsideCastleMoves(r, c, moves, attackedSquares)
+        if queenside:
+            self.getQueensideCastleMoves(r, c, moves, attackedSquares)
         
     #makes sure the squares between the king and the rook on the king side are empty and not under attack by an enemy piece
-    def getKingsideCastleMoves(self, r, c, moves):
+    def getKingsideCastleMoves(self, r, c, moves, attackedSquares):
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
+            if (r, c + 1) not in attackedSquares and (r, c + 2) not in attackedSquares:
                 moves.append(Move((r,c), (r,c+2), self.board, isCastleMove =True))
 
     #makes sure the squares between the king and the rook on the queens side are empty and not under attack by an enemy piece
-    def getQueensideCastleMoves(self, r, c, moves):
+    def getQueensideCastleMoves(self, r, c, moves, attackedSquares):
         if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
+            if (r, c - 1) not in attackedSquares and (r, c - 2) not in attackedSquares:
                 moves.append(Move((r,c), (r,c-2), self.board, isCastleMove =True))
 
 
 
 class CastleRights():
+    __slots__ = ("wks", "bks", "wqs", "bqs")
+
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
         self.bks = bks
@@ -369,26 +740,31 @@ class Move():
     rowsToRanks = {v: k for k, v in ranksToRows.items()}#reverses the dictionary
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h":7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
+    #thousands of moves are made for every search, so they get fixed slots instead of a __dict__ each
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPawnPromotion", "isEnpassantMove", "isCapture", "isCastleMove", "moveID")
 
     def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0] #the piece's starting square row wise 1,2,3....8
-        self.startCol = startSq[1] #the piece's starting square column wise a,b,c...h
-        self.endRow = endSq[0] #the piece's ending square row wise 1,2,3....8
-        self.endCol = endSq[1] #the piece's ending square column wise a,b,c...h
-        self.pieceMoved = board[self.startRow][self.startCol] #Gets the piece moved
-        self.pieceCaptured = board[self.endRow][self.endCol]#Gets the piece captured
-        #pawn promotion stuffs
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7)
+        startRow, startCol = startSq
+        endRow, endCol = endSq
+        self.startRow = startRow #the piece's starting square row wise 1,2,3....8
+        self.startCol = startCol #the piece's starting square column wise a,b,c...h
+        self.endRow = endRow #the piece's ending square row wise 1,2,3....8
+        self.endCol = endCol #the piece's ending square column wise a,b,c...h
+        pieceMoved = board[startRow][startCol] #Gets the piece moved
+        self.pieceMoved = pieceMoved
+        #pawn promotion stuffs, pawns only move forward so a pawn on either end row is promoting
+        self.isPawnPromotion = (endRow == 0 or endRow == 7) and pieceMoved[1] == 'p'
         #en passant stuffs
         self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
-
-        self.isCapture= self.pieceCaptured != '--'
+        if isEnpassantMove:
+            self.pieceCaptured = 'wp' if pieceMoved == 'bp' else 'bp'
+        else:
+            self.pieceCaptured = board[endRow][endCol]#Gets the piece captured
+        self.isCapture = self.pieceCaptured != '--'
         #castle move
         self.isCastleMove = isCastleMove
         #make a unique move id
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        self.moveID = startRow * 1000 + startCol * 100 + endRow * 10 + endCol
 
     #overriding the equals method
     def __eq__(self, other):
@@ -422,8 +798,442 @@ class Move():
         #add an x if a piece is captured
         if self.isCapture:
             moveString += 'x'
-        return moveString + endSquare 
-    
+        return moveString + endSquare
+
+
+#PRECOMPUTED MOVE TABLES
+#built once at import so the move generators don't rebuild direction tuples or check the board edges on every call
+#squares are numbered the same way the board list is read, square = row * 8 + col, so a8 is 0 and h1 is 63
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+KNIGHT_OFFSETS = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
+KING_OFFSETS = ((1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1))
+ROOK_DIRECTIONS = ((-1,0),(0,-1),(1,0),(0,1))#up, left, down, right
+BISHOP_DIRECTIONS = ((-1,-1),(1,-1),(1,1),(-1,1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+#(row, col) of the squares one step away from every square for a list of (row, col) offsets
+def buildStepTargets(offsets):
+    targets = []
+    for square in range(64):
+        r, c = divmod(square, 8)
+        targets.append(tuple((r + dr, c + dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8))
+    return targets
+
+#for every square, one tuple per direction of the (row, col) squares from the nearest to the board edge
+def buildRayTargets(directions):
+    targets = []
+    for square in range(64):
+        r, c = divmod(square, 8)
+        rays = []
+        for d in directions:
+            ray = []
+            for i in range(1, 8):
+                endRow = r + d[0] * i
+                endCol = c + d[1] * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8): #off board
+                    break
+                ray.append((endRow, endCol))
+            rays.append(tuple(ray))
+        targets.append(tuple(rays))
+    return targets
+
+KNIGHT_TARGETS = buildStepTargets(KNIGHT_OFFSETS)
+KING_TARGETS = buildStepTargets(KING_OFFSETS)
+ROOK_RAY_TARGETS = buildRayTargets(ROOK_DIRECTIONS)
+BISHOP_RAY_TARGETS = buildRayTargets(BISHOP_DIRECTIONS)
+RAY_TARGETS = buildRayTargets(DIRECTIONS) #rook directions first, then bishop directions
+
+
+#BITBOARD ENGINE
+#every piece gets a 64 bit number (bitboard) where bit "square" is 1 if that piece is standing on that square
+ALL_SQUARES = (1 << 64) - 1
+FILE_A = 0x0101010101010101 #column 0
+FILE_H = FILE_A << 7 #column 7
+RANK_3 = 0xFF << 40 #row 5, where a white pawn lands after a 1 square advance from its starting row
+RANK_6 = 0xFF << 16 #row 2, where a black pawn lands after a 1 square advance from its starting row
+
+#bitboard of the squares reachable in one step from every square for a list of (row, col) offsets
+def buildStepAttacks(offsets):
+    attacks = []
+    for square in range(64):
+        r, c = divmod(square, 8)
+        mask = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8: #on board
+                mask |= 1 << ((r + dr) * 8 + c + dc)
+        attacks.append(mask)
+    return attacks
+
+#bitboard of every square from each square to the edge of the board in one direction
+def buildRays(direction):
+    rays = []
+    for square in range(64):
+        r, c = divmod(square, 8)
+        mask = 0
+        for i in range(1, 8):
+            endRow = r + direction[0] * i
+            endCol = c + direction[1] * i
+            if not (0 <= endRow < 8 and 0 <= endCol < 8): #off board
+                break
+            mask |= 1 << (endRow * 8 + endCol)
+        rays.append(mask)
+    return rays
+
+KNIGHT_ATTACKS = buildStepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = buildStepAttacks(KING_OFFSETS)
+#squares attacked by a pawn of the given color standing on each square
+PAWN_ATTACKS = {'w': buildStepAttacks(((-1,-1),(-1,1))), 'b': buildStepAttacks(((1,-1),(1,1)))}
+#(rays for every square, True if the ray runs towards higher square numbers) for each sliding direction
+ROOK_RAYS = [(buildRays(d), d[0] > 0 or (d[0] == 0 and d[1] > 0)) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(buildRays(d), d[0] > 0 or (d[0] == 0 and d[1] > 0)) for d in BISHOP_DIRECTIONS]
+
+#between[a][b] is the bitboard of the squares strictly between a and b when they share a row, column or diagonal
+def buildBetween():
+    between = [[0] * 64 for square in range(64)]
+    for startSquare in range(64):
+        r, c = divmod(startSquare, 8)
+        for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            mask = 0
+            for i in range(1, 8):
+                endRow = r + d[0] * i
+                endCol = c + d[1] * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8): #off board
+                    break
+                between[startSquare][endRow * 8 + endCol] = mask
+                mask |= 1 << (endRow * 8 + endCol)
+    return between
+
+BETWEEN = buildBetween()
+
+#squares a sliding piece on square attacks, every ray stops at (and includes) the first piece in the way
+def slidingAttacks(square, occupied, rays):
+    attacks = 0
+    for ray, towardsHigher in rays:
+        mask = ray[square]
+        blockers = mask & occupied
+        if blockers:
+            #the closest blocker is the lowest bit on rays going up and the highest bit on rays going down
+            blocker = (blockers & -blockers).bit_length() - 1 if towardsHigher else blockers.bit_length() - 1
+            mask ^= ray[blocker] #remove everything behind the blocker
+        attacks |= mask
+    return attacks
+
+
+#GameState that keeps a bitboard for every piece next to the 8x8 board and uses them to generate moves
+#the 8x8 board is still updated so the UI and the Move class work the same way as before
+class BitboardGameState(GameState):
+    def __init__(self, fen=None):
+        GameState.__init__(self, fen)
+        self.initBitboards()
+
+    def loadFen(self, fen):
+        GameState.loadFen(self, fen)
+        self.initBitboards()
+
+    #build the bitboards from the 8x8 board
+    def initBitboards(self):
+        self.bitboards = {piece: 0 for piece in PIECES}
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    self.bitboards[self.board[r][c]] |= 1 << (r * 8 + c)
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for piece in PIECES:
+            self.colorBitboards[piece[0]] |= self.bitboards[piece]
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    def makeMove(self, move):
+        GameState.makeMove(self, move)
+        self.toggleMoveBits(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            GameState.undoMove(self)
+            self.toggleMoveBits(move)#xor is its own inverse so the same flips undo the move
+
+    #flip the bits of every square the move changes, works for both making and undoing a move
+    def toggleMoveBits(self, move):
+        bitboards = self.bitboards
+        color = move.pieceMoved[0]
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        bitboards[move.pieceMoved] ^= startBit
+        #pawn promotion
+        if move.isPawnPromotion:
+            bitboards[color + 'Q'] ^= endBit
+        else:
+            bitboards[move.pieceMoved] ^= endBit
+        self.colorBitboards[color] ^= startBit | endBit
+        #captures, en passant pawns are next to the landing square
+        if move.isEnpassantMove:
+            captureBit = 1 << (move.startRow * 8 + move.endCol)
+            bitboards[move.pieceCaptured] ^= captureBit
+            self.colorBitboards[move.pieceCaptured[0]] ^= captureBit
+        elif move.pieceCaptured != "--":
+            bitboards[move.pieceCaptured] ^= endBit
+            self.colorBitboards[move.pieceCaptured[0]] ^= endBit
+        #castle move, the rook jumps over the king
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2: #kingside
+                rookBits = (1 << (move.endRow * 8 + 7)) | (1 << (move.endRow * 8 + 5))
+            else: #queenside
+                rookBits = (1 << (move.endRow * 8)) | (1 << (move.endRow * 8 + 3))
+            bitboards[color + 'R'] ^= rookBits
+            self.colorBitboards[color] ^= rookBits
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    #bitboard of all the pieces of color that attack square, occupied can be given to look through pieces
+    def attackersTo(self, square, color, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.bitboards
+        #a pawn of color attacks square from the squares a pawn of the other color on square would attack
+        attackers = PAWN_ATTACKS['b' if color == 'w' else 'w'][square] & bitboards[color + 'p']
+        attackers |= KNIGHT_ATTACKS[square] & bitboards[color + 'N']
+        attackers |= KING_ATTACKS[square] & bitboards[color + 'K']
+        rooksQueens = bitboards[color + 'R'] | bitboards[color + 'Q']
+        if rooksQueens:
+            attackers |= slidingAttacks(square, occupied, ROOK_RAYS) & rooksQueens
+        bishopsQueens = bitboards[color + 'B'] | bitboards[color + 'Q']
+        if bishopsQueens:
+            attackers |= slidingAttacks(square, occupied, BISHOP_RAYS) & bishopsQueens
+        return attackers
+
+    #determine if the enemy can attack the square r,c
+    def squareUnderAttack(self, r, c):
+        return self.attackersTo(r * 8 + c, 'b' if self.whiteToMove else 'w') != 0
+
+    def hasNonPawnMaterial(self):
+        color = 'w' if self.whiteToMove else 'b'
+        return self.colorBitboards[color] & ~(self.bitboards[color + 'p'] | self.bitboards[color + 'K']) != 0
+
+    #bitboard of every square the pieces of color attack
+    def getAttackedBitboard(self, color):
+        bitboards = self.bitboards
+        pawns = bitboards[color + 'p']
+        if color == 'w':
+            attacked = ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        else:
+            attacked = (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & ALL_SQUARES
+        for piece, table in (('N', KNIGHT_ATTACKS), ('K', KING_ATTACKS)):
+            pieces = bitboards[color + piece]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                attacked |= table[bit.bit_length() - 1]
+        for piece, rays in (('B', (BISHOP_RAYS,)), ('R', (ROOK_RAYS,)), ('Q', (ROOK_RAYS, BISHOP_RAYS))):
+            pieces = bitboards[color + piece]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                for r in rays:
+                    attacked |= slidingAttacks(bit.bit_length() - 1, self.occupied, r)
+        return attacked
+
+    #returns the set of (row, col) squares the enemy attacks, all at once
+    def getAttackedSquares(self):
+        attacked = self.getAttackedBitboard('b' if self.whiteToMove else 'w')
+        squares = set()
+        while attacked:
+            bit = attacked & -attacked
+            attacked ^= bit
+            square = bit.bit_length() - 1
+            squares.add((square >> 3, square & 7))
+        return squares
+
+    #finds the ally pieces pinned to the king on kingSquare
+    #returns a dictionary of pinned square -> bitboard of the squares that piece can still move to
+    def getPins(self, kingSquare, color):
+        pins = {}
+        enemy = 'b' if color == 'w' else 'w'
+        allies = self.colorBitboards[color]
+        for rays, sliders in ((ROOK_RAYS, self.bitboards[enemy + 'R'] | self.bitboards[enemy + 'Q']),
+                              (BISHOP_RAYS, self.bitboards[enemy + 'B'] | self.bitboards[enemy + 'Q'])):
+            if not sliders:
+                continue
+            for ray, towardsHigher in rays:
+                blockers = ray[kingSquare] & self.occupied
+                if not blockers:
+                    continue
+                #the two closest pieces on the ray, an ally followed by an enemy slider is a pin
+                first = (blockers & -blockers).bit_length() - 1 if towardsHigher else blockers.bit_length() - 1
+                blockers ^= 1 << first
+                if not blockers or not (allies >> first) & 1:
+                    continue
+                second = (blockers & -blockers).bit_length() - 1 if towardsHigher else blockers.bit_length() - 1
+                if (sliders >> second) & 1:
+                    pins[first] = BETWEEN[kingSquare][second] | (1 << second)
+        return pins
+
+    #all moves considering checks, pins and checking pieces are found once from the king's square
+    def getValidMoves(self):
+        moves, checkers = self.getLegalMoves(ALL_SQUARES)
+        if not checkers:
+            kingSquare = self.bitboards[('w' if self.whiteToMove else 'b') + 'K'].bit_length() - 1
+            self.getCastleMoves(kingSquare >> 3, kingSquare & 7, moves)
+
+        #If the number of valid moves is 0 then the game is in either checkmate or stalemate
+        if len(moves) == 0:
+            if checkers:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        return moves
+
+    #only the legal captures, for the quiescence search, doesn't set checkMate or staleMate
+    def getValidCaptures(self):
+        return self.getLegalMoves(self.colorBitboards['b' if self.whiteToMove else 'w'])[0]
+
+    #the legal moves without castling that end on a square in targetLimit (en passant is always included)
+    #returns (moves, bitboard of the pieces checking the king)
+    def getLegalMoves(self, targetLimit):
+        color = 'w' if self.whiteToMove else 'b'
+        enemy = 'b' if self.whiteToMove else 'w'
+        kingSquare = self.bitboards[color + 'K'].bit_length() - 1
+        checkers = self.attackersTo(kingSquare, enemy)
+        moves = []
+        if checkers & (checkers - 1) == 0:#not in double check, so pieces other than the king can move
+            if checkers:
+                #capture the checking piece or block the line between it and the king
+                checkerSquare = checkers.bit_length() - 1
+                targetMask = checkers | BETWEEN[kingSquare][checkerSquare]
+            else:
+                targetMask = ALL_SQUARES
+            self.generateMoves(color, targetMask & targetLimit, self.getPins(kingSquare, color), moves)
+            self.getEnpassantBitboardMoves(color, kingSquare, moves)
+        #king moves, looking through the king so it can't step back along the line of a sliding piece
+        kingBit = 1 << kingSquare
+        occupiedWithoutKing = self.occupied ^ kingBit
+        targets = KING_ATTACKS[kingSquare] & ~self.colorBitboards[color] & targetLimit
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            endSquare = bit.bit_length() - 1
+            if not self.attackersTo(endSquare, enemy, occupiedWithoutKing):
+                moves.append(Move((kingSquare >> 3, kingSquare & 7), (endSquare >> 3, endSquare & 7), self.board))
+        return moves, checkers
+
+    #adds a move from startSquare to every square in targets
+    def addMoves(self, startSquare, targets, moves):
+        startSq = (startSquare >> 3, startSquare & 7)
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            endSquare = bit.bit_length() - 1
+            moves.append(Move(startSq, (endSquare >> 3, endSquare & 7), self.board))
+
+    #adds a move for every square in targets, the piece comes from the square offset away from its target
+    def addShiftedMoves(self, targets, offset, pins, moves):
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            endSquare = bit.bit_length() - 1
+            startSquare = endSquare + offset
+            if startSquare in pins and not pins[startSquare] & bit:
+                continue#pinned pawn moving off the pin line
+            moves.append(Move((startSquare >> 3, startSquare & 7), (endSquare >> 3, endSquare & 7), self.board))
+
+    #gets all the possible moves by the piece without considering if the king is in check or not
+    def getAllPossibleMoves(self):
+        moves = []
+        color = 'w' if self.whiteToMove else 'b'
+        self.generateMoves(color, ALL_SQUARES, {}, moves)
+        square = self.bitboards[color + 'K'].bit_length() - 1
+        if square >= 0:
+            self.addMoves(square, KING_ATTACKS[square] & ~self.colorBitboards[color], moves)
+        if self.enpassantPossible != ():
+            endRow, endCol = self.enpassantPossible
+            attackers = PAWN_ATTACKS['b' if color == 'w' else 'w'][endRow * 8 + endCol] & self.bitboards[color + 'p']
+            while attackers:
+                bit = attackers & -attackers
+                attackers ^= bit
+                startSquare = bit.bit_length() - 1
+                moves.append(Move((startSquare >> 3, startSquare & 7), (endRow, endCol), self.board, isEnpassantMove=True))
+        return moves
+
+    #moves of every piece except the king that end on a square in targetMask, pinned pieces stay on their pin line
+    def generateMoves(self, color, targetMask, pins, moves):
+        bitboards = self.bitboards
+        targetMask &= ~self.colorBitboards[color]
+        self.getPawnBitboardMoves(color, targetMask, pins, moves)
+        pieces = bitboards[color + 'N'] #a pinned knight can never move
+        for square in pins:
+            pieces &= ~(1 << square)
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            square = bit.bit_length() - 1
+            self.addMoves(square, KNIGHT_ATTACKS[square] & targetMask, moves)
+        for piece, rays in (('B', (BISHOP_RAYS,)), ('R', (ROOK_RAYS,)), ('Q', (ROOK_RAYS, BISHOP_RAYS))):
+            pieces = bitboards[color + piece]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                square = bit.bit_length() - 1
+                targets = 0
+                for r in rays:
+                    targets |= slidingAttacks(square, self.occupied, r)
+                targets &= targetMask
+                if square in pins:
+                    targets &= pins[square]
+                self.addMoves(square, targets, moves)
+
+    #all pawn pushes and captures of one color at once by shifting the pawn bitboard
+    def getPawnBitboardMoves(self, color, targetMask, pins, moves):
+        pawns = self.bitboards[color + 'p']
+        empty = ALL_SQUARES ^ self.occupied
+        if color == 'w':#white pawns move towards row 0
+            enemies = self.colorBitboards['b'] & targetMask
+            singlePushes = (pawns >> 8) & empty
+            self.addShiftedMoves(singlePushes & targetMask, 8, pins, moves)
+            self.addShiftedMoves(((singlePushes & RANK_3) >> 8) & empty & targetMask, 16, pins, moves)
+            self.addShiftedMoves(((pawns & ~FILE_A) >> 9) & enemies, 9, pins, moves)#captures to the left
+            self.addShiftedMoves(((pawns & ~FILE_H) >> 7) & enemies, 7, pins, moves)#captures to the right
+        else:#black pawns move towards row 7
+            enemies = self.colorBitboards['w'] & targetMask
+            singlePushes = (pawns << 8) & empty
+            self.addShiftedMoves(singlePushes & targetMask, -8, pins, moves)
+            self.addShiftedMoves(((singlePushes & RANK_6) << 8) & empty & targetMask, -16, pins, moves)
+            self.addShiftedMoves(((pawns & ~FILE_A) << 7) & enemies, -7, pins, moves)#captures to the left
+            self.addShiftedMoves(((pawns & ~FILE_H) << 9) & enemies, -9, pins, moves)#captures to the right
+
+    #legal en passant captures, checked by looking at the king with both pawns taken off the board
+    def getEnpassantBitboardMoves(self, color, kingSquare, moves):
+        if self.enpassantPossible == ():
+            return
+        enemy = 'b' if color == 'w' else 'w'
+        endRow, endCol = self.enpassantPossible
+        endBit = 1 << (endRow * 8 + endCol)
+        #the pawns that can take en passant are the ones an enemy pawn on the landing square would attack
+        attackers = PAWN_ATTACKS[enemy][endRow * 8 + endCol] & self.bitboards[color + 'p']
+        while attackers:
+            bit = attackers & -attackers
+            attackers ^= bit
+            startSquare = bit.bit_length() - 1
+            captureBit = 1 << ((startSquare >> 3) * 8 + endCol)
+            occupied = (self.occupied ^ bit ^ captureBit) | endBit
+            if (PAWN_ATTACKS[color][kingSquare] & (self.bitboards[enemy + 'p'] ^ captureBit)) or \
+                    (KNIGHT_ATTACKS[kingSquare] & self.bitboards[enemy + 'N']) or \
+                    (slidingAttacks(kingSquare, occupied, ROOK_RAYS) & (self.bitboards[enemy + 'R'] | self.bitboards[enemy + 'Q'])) or \
+                    (slidingAttacks(kingSquare, occupied, BISHOP_RAYS) & (self.bitboards[enemy + 'B'] | self.bitboards[enemy + 'Q'])):
+                continue#king would be left in check
+            moves.append(Move((startSquare >> 3, startSquare & 7), (endRow, endCol), self.board, isEnpassantMove=True))
+
+#ZOBRIST HASHING
+#every piece on every square, the side to move, each set of castling rights and each en passant column gets a random 64 bit number
+#the key of a position is all of its numbers xor'ed together, so a move only has to xor out what it changes
+#the generator is seeded so keys are the same in every process and every run
+zobristRandom = random.Random(20231)
+ZOBRIST_PIECES = {piece: [zobristRandom.getrandbits(64) for square in range(64)] for piece in PIECES}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for rights in range(16)] #one for each combination of the 4 rights
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
+
+#zobrist number for a set of castle rights
+def zobristCastleKey(castleRights):
+    return ZOBRIST_CASTLING[castleRights.wks | castleRights.bks << 1 | castleRights.wqs << 2 | castleRights.bqs << 3]
+
 #END OF ENGINE
 
 #-------------------------------------------------------------------------------------------------------------------
@@ -555,20 +1365,245 @@ blackKingScores = [
 #dictionary for the piece scores tables
 piecePositionScores = {"wK": whiteKingScores, "bK":blackKingScores, "N":knightScores,  "Q": queenScores, "wB": whiteBishopScores, "bB": blackBishopScores, "wR": whiteRookScores, "bR":blackRookScores, "bp":blackPawnScores, "wp":whitePawnScores}
 
+#piece value plus position score for every colored piece on every square, indexed by row * 8 + col
+#white pieces are positive and black pieces negative, so scoring a board is just adding up table entries
+def buildPieceSquareScores():
+    tables = {}
+    for piece in PIECES:
+        #pawns, rooks, kings and bishops have a table for each color, knights and queens share one
+        positionScores = piecePositionScores[piece] if piece[1] in "pRKB" else piecePositionScores[piece[1]]
+        sign = 1 if piece[0] == 'w' else -1
+        tables[piece] = [sign * (pieceScores[piece[1]] + positionScores[row][col]) for row in range(8) for col in range(8)]
+    return tables
+
+PIECE_SQUARE_SCORES = buildPieceSquareScores()
+
 CHECKMATE = 10000 #value of a checkmate since it wins the game, so make it very valuable
 STALEMATE = 0 #value of a stalemate, make it 0, so that it can be reached but might not be the best move
 DEPTH = 2 # number of moves ahead the AI will look, can handle, 4-5 max, the greater the number the longer it takes for a move to happen
+TT_SIZE_MB = 16 #memory cap of the transposition table in megabytes
+TIME_LIMIT = None #seconds the AI can think about a move, None searches to DEPTH instead
+MAX_DEPTH = 64 #deepest iteration when the search is only limited by time or nodes
+DELTA_MARGIN = 20 #how much positional score a capture might win on top of the piece it takes, used to skip hopeless captures
+PARALLEL_WORKERS = 1 #processes the root moves are split across, 1 searches everything in one process
+NULL_MOVE_PRUNING = True #skip a node when passing the turn still scores at least beta
+NULL_MOVE_REDUCTION = 2 #how much shallower the search after a passed turn is
+NULL_MOVE_MIN_DEPTH = 3 #remaining depth needed before a null move is tried
+LATE_MOVE_REDUCTIONS = True #search quiet moves that are ordered late one ply shallower, again at full depth if they turn out good
+LMR_MIN_DEPTH = 3 #remaining depth needed before moves are reduced
+LMR_MIN_MOVES = 3 #moves searched at full depth before the rest are reduced
+PRINCIPAL_VARIATION_SEARCH = True #search every move after the first with a null window that only proves it isn't better
+ASPIRATION_WINDOWS = True #start each iteration with a narrow window around the score of the last one
+ASPIRATION_WINDOW = 5 #half the width of the first window, it doubles every time the score falls outside
+BOOK_FILE = "book.bin" #opening book made by ChessBook.py, None (or no file) searches every move
+TABLEBASE_DIR = "tablebases" #folder of the endgame tables made by ChessTablebase.py, None (or no files) searches endgames as usual
+searchRandom = random.Random() #shuffles the root moves and picks random and book moves, seed it to make searches repeatable
+
+#TRANSPOSITION TABLE
+#remembers the result of every position the search has finished so a position reached through a different move order isn't searched again
+#the entries live in fixed size arrays so the memory used never grows past the cap
+EXACT = 0 #the score is the real score of the position
+LOWERBOUND = 1 #the search failed high, the real score is at least the score
+UPPERBOUND = 2 #the search failed low, the real score is at most the score
+TT_ENTRY_BYTES = 8 + 8 + 2 + 1 + 1 + 1 #key, score, best move id, depth, bound type, age
+
+class TranspositionTable():
+    def __init__(self, sizeMB=TT_SIZE_MB):
+        #the number of entries is a power of 2 so the slot of a key is just its lowest bits
+        entries = 1
+        while entries * 2 * TT_ENTRY_BYTES <= sizeMB * 1024 * 1024:
+            entries *= 2
+        self.size = entries
+        self.mask = entries - 1
+        self.keys = array('Q', bytes(8 * entries))
+        self.scores = array('d', bytes(8 * entries))
+        self.moves = array('h', bytes(2 * entries)) #moveID of the best move, -1 if there is none
+        self.depths = array('b', [-1]) * entries #-1 marks an empty slot
+        self.flags = array('B', bytes(entries))
+        self.ages = array('B', bytes(entries))
+        self.age = 0 #which search the entries were stored in, older entries are always replaced
+
+    #call before every new search so entries from earlier searches can be replaced first
+    def newSearch(self):
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.depths = array('b', [-1]) * self.size
+        self.age = 0
+
+    #returns (depth, score, flag, moveID) stored for key or None
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] != key or self.depths[index] < 0:
+            return None
+        return self.depths[index], self.scores[index], self.flags[index], self.moves[index]
+
+    #depth preferred replacement, a slot holding the same position, an entry from an older search or a
+    #shallower search is overwritten, a deeper entry from the current search is kept
+    def store(self, key, depth, score, flag, moveID):
+        index = key & self.mask
+        if self.keys[index] == key or self.ages[index] != self.age or depth >= self.depths[index]:
+            self.keys[index] = key
+            self.depths[index] = depth
+            self.scores[index] = score
+            self.flags[index] = flag
+            self.moves[index] = moveID
+            self.ages[index] = self.age
+
+#one table per process so it stays filled between moves when the same process keeps searching
+transpositionTable = TranspositionTable()
+
+#OPENING BOOK
+#a file of (position key, move id, weight) records sorted by key, the zobrist keys are the same in every run
+#the file is memory mapped and binary searched, so only the pages a lookup touches are ever read
+BOOK_RECORD = struct.Struct("<QHH")
+
+class OpeningBook():
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size // BOOK_RECORD.size #number of records
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else b""
+
+    #[(moveID, weight)] of every book move for the position key, empty if the position isn't in the book
+    def lookup(self, key):
+        low, high = 0, self.size
+        while low < high:#first record with a key that isn't smaller
+            middle = (low + high) // 2
+            if BOOK_RECORD.unpack_from(self.data, middle * BOOK_RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            recordKey, moveID, weight = BOOK_RECORD.unpack_from(self.data, low * BOOK_RECORD.size)
+            if recordKey != key:
+                break
+            entries.append((moveID, weight))
+            low += 1
+        return entries
+
+    def close(self):
+        if self.size > 0:
+            self.data.close()
+        self.file.close()
+
+openingBook = None #opened the first time it is needed, in the process that needs it
+
+#a book move for the position picked at random by weight, None when there is no book or the position isn't in it
+def findBookMove(gs, validMoves):
+    global openingBook
+    if BOOK_FILE is None:
+        return None
+    if openingBook is None:
+        if not os.path.exists(BOOK_FILE):
+            return None
+        openingBook = OpeningBook(BOOK_FILE)
+    movesByID = {move.moveID: move for move in validMoves}
+    entries = [(moveID, weight) for moveID, weight in openingBook.lookup(gs.zobristKey) if moveID in movesByID]
+    if len(entries) == 0:
+        return None
+    pick = searchRandom.randint(1, sum(weight for moveID, weight in entries))
+    for moveID, weight in entries:
+        pick -= weight
+        if pick <= 0:
+            return movesByID[moveID]
+
+#ENDGAME TABLEBASES
+#king and queen, rook or pawn against a lone king, solved for every placement of the 3 pieces and both sides to move
+#the tables are stored with white as the side with the extra piece, positions where black has it are looked up upside down
+#every position takes one byte: 0 for a draw, otherwise 1 + the number of plies until the side with the piece mates
+TABLEBASE_MATERIAL = ("KQK", "KRK", "KPK")
+TABLEBASE_SIZE = 64 * 64 * 64 * 2
+TABLEBASE_WIN = CHECKMATE // 2 #won tablebase positions score this minus the plies to mate, below a real checkmate and above any material
+
+#position of a table entry, the squares are row * 8 + col
+def tablebaseIndex(whiteKing, blackKing, pieceSquare, whiteToMove):
+    return ((whiteKing * 64 + blackKing) * 64 + pieceSquare) * 2 + (0 if whiteToMove else 1)
+
+class Tablebase():
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def probe(self, index):
+        return self.data[index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+tablebases = {} #material like "KQK" to its Tablebase (None when there is no file), opened the first time it is needed
+
+def getTablebase(material):
+    if material not in tablebases:
+        path = os.path.join(TABLEBASE_DIR, material + ".tb")
+        tablebases[material] = Tablebase(path) if os.path.exists(path) else None
+    return tablebases[material]
+
+#score of a position with at most 3 pieces (positive is good for white), None when no table covers it
+def probeTablebase(gs):
+    if gs.pieceCount > 3 or TABLEBASE_DIR is None:
+        return None
+    if gs.pieceCount == 2:#only the kings are left
+        return STALEMATE
+    kings = {}
+    for r in range(8):
+        for c in range(8):
+            square = gs.board[r][c]
+            if square == "--":
+                continue
+            if square[1] == 'K':
+                kings[square[0]] = r * 8 + c
+            else:
+                piece = square
+                pieceSquare = r * 8 + c
+    if piece[1] == 'B' or piece[1] == 'N':#a king and a minor piece can't force mate
+        return STALEMATE
+    rights = gs.currentCastlingRight
+    if rights.wks or rights.bks or rights.wqs or rights.bqs:#the tables have no castling
+        return None
+    table = getTablebase("K" + piece[1].upper() + "K")
+    if table is None:
+        return None
+    if piece[0] == 'w':
+        value = table.probe(tablebaseIndex(kings['w'], kings['b'], pieceSquare, gs.whiteToMove))
+        sign = 1
+    else:#turn the board upside down and swap the colors, square ^ 56 is the same column on the mirrored row
+        value = table.probe(tablebaseIndex(kings['b'] ^ 56, kings['w'] ^ 56, pieceSquare ^ 56, not gs.whiteToMove))
+        sign = -1
+    if value == 0:
+        return STALEMATE
+    return sign * (TABLEBASE_WIN - (value - 1))
+
+#the move with the best tablebase score, the fastest mate when winning and the slowest when losing
+#None when the position or one of its moves isn't covered by the tables
+def findTablebaseMove(gs, validMoves):
+    if gs.pieceCount > 3 or probeTablebase(gs) is None:
+        return None
+    turnMulitplier = 1 if gs.whiteToMove else -1
+    bestMove = None
+    bestScore = -CHECKMATE
+    for move in validMoves:
+        gs.makeMove(move)
+        score = probeTablebase(gs)
+        gs.undoMove()
+        if score is None:
+            return None
+        if turnMulitplier * score > bestScore:
+            bestScore = turnMulitplier * score
+            bestMove = move
+    return bestMove
 
 #picks a random Move and returns it
 def findRandomMove(validMoves):
-    return validMoves[random.randint(0, len(validMoves) -1)]
+    return validMoves[searchRandom.randint(0, len(validMoves) -1)]
 
 #finds the best move based on material alone
 def findBestMoveMinMaxNoRecursion(gs, validMoves):
     turnMultiplier =  1 if gs.whiteToMove else -1
     opponentMinMaxScore = CHECKMATE
     bestPlayerMove = None
-    random.shuffle(validMoves)
+    searchRandom.shuffle(validMoves)
     for playerMove in validMoves:
         gs.makeMove(playerMove)
         opponentsMoves = gs.getValidMoves()
@@ -598,17 +1633,58 @@ def findBestMoveMinMaxNoRecursion(gs, validMoves):
     return bestPlayerMove
 
 #helper method to make first recursive call
-def findBestMove(gs, validMoves, returnQueue):
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)#shuffle moves to make the Nega Max Alpha Beta algorithm stronger
+#searches to depth, or as deep as it can within timeLimit seconds / nodeLimit nodes when one of them is given
+def findBestMove(gs, validMoves, returnQueue, depth=None, timeLimit=None, nodeLimit=None):
+    returnQueue.put(searchBestMove(gs, validMoves, depth, timeLimit, nodeLimit)) #multiprocessing
+
+#runs the search and returns the best move, None if the search was stopped before it finished a single root move
+def searchBestMove(gs, validMoves, depth=None, timeLimit=None, nodeLimit=None):
+    return searchPosition(gs, validMoves, depth, timeLimit, nodeLimit).bestMove
+
+#runs the search and returns a SearchResult with the best move, its score and the numbers of how the search went
+#profile=True also times every getValidMoves, makeMove, undoMove and scoreBoard call, which slows the search down
+#with PARALLEL_WORKERS > 1 only the calls made by this process are timed, not the ones in the pool processes
+def searchPosition(gs, validMoves, depth=None, timeLimit=None, nodeLimit=None, profile=False):
+    global nextMove, nodesSearched
+    start = time.perf_counter()
+    result = SearchResult()
+    nextMove = findBookMove(gs, validMoves)
+    result.source = "book"
+    if nextMove is None:
+        nextMove = findTablebaseMove(gs, validMoves)
+        result.source = "tablebase"
+    if nextMove is not None:#known opening or solved endgame, no search needed
+        nodesSearched = 0
+        result.bestMove = nextMove
+        result.principalVariation = [nextMove]
+        result.elapsed = time.perf_counter() - start
+        return result
+    result.source = "search"
+    if timeLimit is None:
+        timeLimit = TIME_LIMIT
+    if depth is None:
+        depth = DEPTH if timeLimit is None and nodeLimit is None else MAX_DEPTH
+    searchRandom.shuffle(validMoves)#shuffle moves to make the Nega Max Alpha Beta algorithm stronger
     #findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    returnQueue.put(nextMove) #multiprocessing
+    if profile:
+        startProfiling(gs, result.timings)
+    try:
+        if PARALLEL_WORKERS > 1 and nodeLimit is None and len(validMoves) > 1:
+            parallelRootSearch(gs, validMoves, depth, timeLimit, PARALLEL_WORKERS, result)
+        else:
+            iterativeDeepening(gs, validMoves, depth, timeLimit, nodeLimit, result)
+    finally:
+        if profile:
+            stopProfiling(gs)
+    result.elapsed = time.perf_counter() - start
+    result.principalVariation = getPrincipalVariation(gs, result.bestMove, result.depth)
+    nextMove = result.bestMove
+    return result
 
 #helper function
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
-    global nextMove
+    global nextMove, nodesSearched
+    nodesSearched += 1
     if depth == 0:
         return scoreMaterial(gs.board)
 
@@ -639,7 +1715,8 @@ def findMoveMinMax(gs, validMoves, depth, whiteToMove):
 
 #helper function
 def findMoveNegaMax(gs, validMoves, depth, turnMulitplier):
-    global nextMove
+    global nextMove, nodesSearched
+    nodesSearched += 1
     if depth == 0:
         return turnMulitplier * scoreBoard(gs)
     maxScore = -CHECKMATE
@@ -655,28 +1732,664 @@ def findMoveNegaMax(gs, validMoves, depth, turnMulitplier):
     return maxScore
 
 #Implements the NegaMaxAlphaBeta algorithm to find the best move by pruning poor moves
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMulitplier):
-    global nextMove
+#ply is how many moves deep the node is, 0 at the root, allowNull is False right after a null move so two aren't made in a row
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMulitplier, ply=0, allowNull=True):
+    global nextMove, nodesSearched
+    nodesSearched += 1
+    if searchAborted or searchLimitReached():
+        return 0#the score is thrown away
+    #a position already reached in the game or on this line is scored as a draw right away, repeating it
+    #is always possible so the side that is ahead has to find something else
+    if ply != 0 and (gs.isRepetition(2) or gs.isFiftyMoveDraw()):
+        return STALEMATE
+    if ply != 0 and gs.pieceCount <= 3:#solved endgame, the tables know the result
+        score = probeTablebase(gs)
+        if score is not None:
+            return turnMulitplier * score
     if depth == 0:
-        return turnMulitplier * scoreBoard(gs)
-    
-    #move ordering - implement later
+        return quiescenceSearch(gs, alpha, beta, turnMulitplier, ply, validMoves)
+
+    #use the stored result if this position was already searched at least as deep
+    alphaOriginal = alpha
+    entry = transpositionTable.probe(gs.zobristKey)
+    searchStats["ttProbes"] += 1
+    if entry is not None:
+        searchStats["ttHits"] += 1
+    if entry is not None and entry[0] >= depth and ply != 0:#the root still has to pick nextMove
+        ttScore, ttFlag = entry[1], entry[2]
+        if ttFlag == EXACT:
+            return ttScore
+        elif ttFlag == LOWERBOUND:
+            alpha = max(alpha, ttScore)
+        elif ttFlag == UPPERBOUND:
+            beta = min(beta, ttScore)
+        if alpha >= beta:
+            return ttScore
+
+    inCheck = depth >= min(NULL_MOVE_MIN_DEPTH, LMR_MIN_DEPTH) and gs.inCheck()
+    #null move pruning, if the position is still good enough after passing the turn, a real move would be too
+    #not in check (passing would be illegal) or with only pawns left, where having to move can be what loses
+    if NULL_MOVE_PRUNING and allowNull and ply != 0 and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and \
+            abs(beta) < TABLEBASE_WIN and gs.hasNonPawnMaterial():
+        searchStats["nullMoveTries"] += 1
+        gs.makeNullMove()
+        score = -findMoveNegaMaxAlphaBeta(gs, gs.getValidMoves(), max(0, depth - 1 - NULL_MOVE_REDUCTION), -beta, -beta + 1, -turnMulitplier, ply+1, False)
+        gs.undoNullMove()
+        if searchAborted:
+            return 0
+        if score >= beta:
+            searchStats["nullMoveCutoffs"] += 1
+            return beta#the null search only proved a bound, not a real score
+
+    #move ordering, the best move of an earlier search of this position (like the last iteration) goes first
+    orderMoves(validMoves, entry[3] if entry is not None else -1, ply)
     maxScore = -CHECKMATE
-    for move in validMoves:
+    bestMoveID = -1
+    for i, move in enumerate(validMoves):
         gs.makeMove(move)
         nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMulitplier)
+        if i == 0:#the expected best move gets the full window
+            score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMulitplier, ply+1)
+        else:
+            fullDepth = True
+            #late move reductions, quiet moves ordered late rarely turn out best so they get a shallower null window search first
+            if LATE_MOVE_REDUCTIONS and i >= LMR_MIN_MOVES and depth >= LMR_MIN_DEPTH and not inCheck and \
+                    not move.isCapture and not move.isPawnPromotion and not gs.inCheck():
+                searchStats["lmrReductions"] += 1
+                score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-2, -alpha-1, -alpha, -turnMulitplier, ply+1)
+                fullDepth = score > alpha and not searchAborted#better than expected, search it properly
+                if fullDepth:
+                    searchStats["lmrResearches"] += 1
+            if PRINCIPAL_VARIATION_SEARCH:
+                #principal variation search, a null window around alpha is enough to prove the move is no better
+                #than the ones before it, only a move that beats alpha needs its real score from a full window search
+                if fullDepth:
+                    score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -alpha-1, -alpha, -turnMulitplier, ply+1)
+                if alpha < score < beta and beta - alpha > 1 and not searchAborted:
+                    searchStats["pvsResearches"] += 1
+                    score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMulitplier, ply+1)
+            elif fullDepth:
+                score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMulitplier, ply+1)
+        gs.undoMove()
+        if searchAborted:
+            return 0#out of time, the unfinished result must not be stored or picked
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
+            bestMoveID = move.moveID
+            #a score at or below alpha is only an upper bound, so at the root a later move with a higher bound
+            #isn't better, the first move stays the one to play unless a move really beats alpha
+            if ply == 0 and (i == 0 or score > alphaOriginal):
                 nextMove = move
-        gs.undoMove()
         if maxScore > alpha: #pruning happens
             alpha = maxScore
+        if alpha >= beta:
+            searchStats["betaCutoffs"] += 1
+            if i == 0:
+                searchStats["firstMoveCutoffs"] += 1
+            if not move.isCapture and not move.isPawnPromotion:
+                updateKillersAndHistory(move, depth, ply)
+            break
+
+    #store the result with how far it can be trusted
+    if maxScore <= alphaOriginal:
+        flag = UPPERBOUND
+    elif maxScore >= beta:
+        flag = LOWERBOUND
+    else:
+        flag = EXACT
+    if flag == UPPERBOUND and ply == 0:#no root move reached the aspiration window, keep the last iteration's best move first
+        bestMoveID = validMoves[0].moveID
+    transpositionTable.store(gs.zobristKey, depth, maxScore, flag, bestMoveID)
+    return maxScore
+
+#keeps searching captures below the nominal depth so a position isn't scored in the middle of a trade
+#the side to move can always "stand pat" and take the static score instead of capturing, unless it is in check
+#validMoves is only passed by the main search, which already counted the node it hands over
+def quiescenceSearch(gs, alpha, beta, turnMulitplier, ply, validMoves=None):
+    global nodesSearched
+    if validMoves is None:
+        nodesSearched += 1
+    searchStats["quiescenceNodes"] += 1#a subset of nodesSearched, the nodes scored by the quiescence search
+    if searchAborted or searchLimitReached():
+        return 0#the score is thrown away
+    if gs.checkMate or gs.staleMate:
+        return turnMulitplier * scoreBoard(gs)
+    inCheck = gs.inCheck()
+    if inCheck:
+        #every move out of check has to be searched, and no moves is checkmate
+        moves = validMoves if validMoves is not None else gs.getValidMoves()
+        if len(moves) == 0:
+            return turnMulitplier * scoreBoard(gs)
+        maxScore = standPat = -CHECKMATE
+    else:
+        maxScore = standPat = turnMulitplier * scoreBoard(gs)
+        if standPat >= beta:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        moves = gs.getValidCaptures()
+    orderMoves(moves, -1, ply)
+    for move in moves:
+        #delta pruning, skip captures that can't bring the score back up to alpha even with a margin
+        if not inCheck and move.isCapture:
+            gain = pieceScores[move.pieceCaptured[1]] + (pieceScores['Q'] if move.isPawnPromotion else 0)
+            if standPat + gain + DELTA_MARGIN <= alpha:
+                continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMulitplier, ply+1)
+        gs.undoMove()
+        if searchAborted:
+            return 0
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
         if alpha >= beta:
             break
     return maxScore
 
+#MOVE ORDERING
+#alpha beta prunes the most when the best move is searched first
+killerMoves = [[-1, -1] for ply in range(MAX_DEPTH + 1)] #moveIDs of the last 2 quiet moves that caused a cutoff at each ply
+historyScores = {piece: [0] * 64 for piece in PIECES} #how much each piece moving to each square has caused cutoffs
+HISTORY_LIMIT = 50000 #history scores are halved when one gets this big so they stay below the killer move scores
+
+#sorts the moves from most to least likely to cause a cutoff:
+#the hash move, captures by most valuable victim / least valuable attacker, killer moves, then quiet moves by history score
+def orderMoves(moves, hashMoveID, ply):
+    killers = killerMoves[ply] if ply < len(killerMoves) else (-1, -1)
+    def moveOrderScore(move):
+        if move.moveID == hashMoveID:
+            return 1000000
+        if move.isCapture or move.isPawnPromotion:
+            victimScore = pieceScores[move.pieceCaptured[1]] if move.isCapture else 0
+            if move.isPawnPromotion:
+                victimScore += pieceScores['Q']
+            return 100000 + 10 * victimScore - pieceScores[move.pieceMoved[1]]
+        if move.moveID == killers[0]:
+            return 90000
+        if move.moveID == killers[1]:
+            return 80000
+        return historyScores[move.pieceMoved][move.endRow * 8 + move.endCol]
+    moves.sort(key=moveOrderScore, reverse=True)#stable, so equal moves keep their shuffled order
+
+#a quiet move caused a beta cutoff, remember it for its sibling positions and the rest of the tree
+def updateKillersAndHistory(move, depth, ply):
+    if ply < len(killerMoves) and killerMoves[ply][0] != move.moveID:
+        killerMoves[ply][1] = killerMoves[ply][0]
+        killerMoves[ply][0] = move.moveID
+    history = historyScores[move.pieceMoved]
+    square = move.endRow * 8 + move.endCol
+    history[square] += depth * depth#deeper cutoffs save more work
+    if history[square] > HISTORY_LIMIT:
+        for piece in historyScores:
+            historyScores[piece] = [score // 2 for score in historyScores[piece]]
+
+#killer moves are only useful within one search, history is kept but counts less than new cutoffs
+def newOrderingSearch():
+    for killers in killerMoves:
+        killers[0] = killers[1] = -1
+    for piece in historyScores:
+        historyScores[piece] = [score // 2 for score in historyScores[piece]]
+
+#forgets everything learned in earlier searches, for a new game or a search that has to be repeatable
+def clearSearchMemory():
+    transpositionTable.clear()
+    for killers in killerMoves:
+        killers[0] = killers[1] = -1
+    for piece in historyScores:
+        historyScores[piece] = [0] * 64
+
+#search limits, set by iterativeDeepening
+nodesSearched = 0
+searchDeadline = None #time.monotonic() value to stop at, None for no time limit, the same clock in every process
+searchNodeLimit = None #number of nodes to stop at, None for no node limit
+searchAborted = False #set once a limit is hit, every node returns right away after that
+searchStopConnection = None #pipe of the search worker process, any message waiting on it stops the search
+#counts of the last search
+searchStats = {"quiescenceNodes": 0, "betaCutoffs": 0, "firstMoveCutoffs": 0, "ttProbes": 0, "ttHits": 0,
+               "nullMoveTries": 0, "nullMoveCutoffs": 0, "lmrReductions": 0, "lmrResearches": 0,
+               "pvsResearches": 0, "aspirationResearches": 0}
+STOP_CHECK_NODES = 1024 #how often (in nodes) the search worker looks for a message
+
+#checks the time and node budget of the running search
+def searchLimitReached():
+    global searchAborted
+    if (searchDeadline is not None and time.monotonic() >= searchDeadline) or \
+            (searchNodeLimit is not None and nodesSearched >= searchNodeLimit) or \
+            (searchStopConnection is not None and nodesSearched % STOP_CHECK_NODES == 0 and searchStopConnection.poll()) or \
+            (rootAbort is not None and nodesSearched % STOP_CHECK_NODES == 0 and rootAbort.value):
+        searchAborted = True
+    return searchAborted
+
+#searches depth 1, then 2, then 3... up to maxDepth or until the time or node budget runs out
+#returns the best move of the deepest search, the best move of each depth is searched first in the next one
+#and the transposition table orders the moves further down the tree
+#fills in result (a SearchResult) when one is given and returns the best move
+def iterativeDeepening(gs, validMoves, maxDepth, timeLimit=None, nodeLimit=None, result=None):
+    global nextMove, nodesSearched, searchDeadline, searchNodeLimit, searchAborted
+    if result is None:
+        result = SearchResult()
+    nodesSearched = 0
+    for stat in searchStats:
+        searchStats[stat] = 0
+    searchDeadline = time.monotonic() + timeLimit if timeLimit is not None else None
+    searchNodeLimit = nodeLimit
+    searchAborted = False
+    transpositionTable.newSearch()
+    newOrderingSearch()
+    moves = list(validMoves)
+    bestMove = None
+    score = None
+    for depth in range(1, maxDepth + 1):
+        nextMove = None
+        depthStart = time.perf_counter()
+        depthNodes = nodesSearched
+        #aspiration window, the score rarely moves far from the last iteration's and a narrow window prunes more
+        window = ASPIRATION_WINDOW
+        if ASPIRATION_WINDOWS and score is not None and abs(score) < TABLEBASE_WIN:
+            alpha, beta = max(score - window, -CHECKMATE), min(score + window, CHECKMATE)
+        else:
+            alpha, beta = -CHECKMATE, CHECKMATE
+        while True:
+            score = findMoveNegaMaxAlphaBeta(gs, moves, depth, alpha, beta, 1 if gs.whiteToMove else -1)
+            if searchAborted:
+                break
+            if score <= alpha and alpha > -CHECKMATE:#failed low, every move was only proved to be below alpha
+                nextMove = None
+                alpha = max(alpha - window, -CHECKMATE)
+            elif score >= beta and beta < CHECKMATE:#failed high, nextMove is better than expected but its score isn't known
+                beta = min(beta + window, CHECKMATE)
+            else:
+                break
+            searchStats["aspirationResearches"] += 1
+            window *= 2
+        #a stopped search still found the best of the root moves it finished, and the best move
+        #of the last depth is always searched first, so its move is at least as good
+        if nextMove is not None:
+            bestMove = nextMove
+            moves.remove(bestMove)
+            moves.insert(0, bestMove)
+        if not searchAborted:
+            result.addDepth(depth, score, nodesSearched - depthNodes, time.perf_counter() - depthStart)
+        if searchAborted or abs(score) >= CHECKMATE:#out of budget or a forced mate was found
+            break
+    searchAborted = False
+    searchDeadline = None
+    searchNodeLimit = None
+    result.bestMove = bestMove
+    result.nodes = nodesSearched
+    result.stats = dict(searchStats)
+    return bestMove
+
+#SEARCH RESULTS
+#what a search found and the numbers of how it went, for tuning the AI and seeing how fast it is
+class SearchResult():
+    def __init__(self):
+        self.bestMove = None
+        self.score = 0 #score of the deepest finished depth, positive is good for the side to move
+        self.depth = 0 #deepest depth that finished
+        self.principalVariation = [] #the moves both sides are expected to play, starting with bestMove
+        self.source = "search" #"book", "tablebase" or "search"
+        self.nodes = 0
+        self.elapsed = 0.0 #seconds
+        self.stats = {} #copy of searchStats
+        self.depthStats = [] #{"depth", "score", "nodes", "seconds", "nps"} of every finished depth
+        self.timings = {} #function name: [calls, seconds], only filled in when profiling
+
+    def addDepth(self, depth, score, nodes, seconds):
+        self.depth = depth
+        self.score = score
+        self.depthStats.append({"depth": depth, "score": score, "nodes": nodes, "seconds": seconds, "nps": nodes / seconds if seconds > 0 else 0.0})
+
+    def nodesPerSecond(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    #share of the searched nodes that were in the quiescence search
+    def quiescenceRate(self):
+        return self.stats.get("quiescenceNodes", 0) / self.nodes if self.nodes > 0 else 0.0
+
+    #share of the beta cutoffs that came from the first move searched, high means the move ordering works
+    def firstMoveCutoffRate(self):
+        cutoffs = self.stats.get("betaCutoffs", 0)
+        return self.stats.get("firstMoveCutoffs", 0) / cutoffs if cutoffs > 0 else 0.0
+
+    #beta cutoffs per node of the main search
+    def betaCutoffRate(self):
+        mainNodes = self.nodes - self.stats.get("quiescenceNodes", 0)
+        return self.stats.get("betaCutoffs", 0) / mainNodes if mainNodes > 0 else 0.0
+
+    def ttHitRate(self):
+        probes = self.stats.get("ttProbes", 0)
+        return self.stats.get("ttHits", 0) / probes if probes > 0 else 0.0
+
+    #everything as plain numbers and strings, e.g. for writing out as JSON
+    def toDict(self):
+        return {"bestMove": self.bestMove.getChessNotation() if self.bestMove is not None else None,
+                "score": self.score, "depth": self.depth, "source": self.source,
+                "principalVariation": [move.getChessNotation() for move in self.principalVariation],
+                "nodes": self.nodes, "seconds": round(self.elapsed, 4), "nps": round(self.nodesPerSecond()),
+                "quiescenceRate": round(self.quiescenceRate(), 4), "betaCutoffRate": round(self.betaCutoffRate(), 4),
+                "firstMoveCutoffRate": round(self.firstMoveCutoffRate(), 4), "ttHitRate": round(self.ttHitRate(), 4),
+                "stats": self.stats, "depthStats": self.depthStats, "timings": self.timings}
+
+#bestMove followed by the best move of each position after it that the transposition table still has, up to length moves
+def getPrincipalVariation(gs, bestMove, length):
+    variation = []
+    move = bestMove
+    seen = set()
+    while move is not None and len(variation) < max(length, 1) and gs.zobristKey not in seen:
+        seen.add(gs.zobristKey)
+        variation.append(move)
+        gs.makeMove(move)
+        entry = transpositionTable.probe(gs.zobristKey)
+        move = None
+        if entry is not None and entry[3] >= 0:
+            for nextMove in gs.getValidMoves():
+                if nextMove.moveID == entry[3]:
+                    move = nextMove
+                    break
+    for i in range(len(variation)):
+        gs.undoMove()
+    return variation
+
+#profiling hook, swaps the functions the search calls most for versions that add their call count and time to timings
+def timedFunction(function, name, timings):
+    timings[name] = [0, 0.0]
+    def timed(*args):
+        start = time.perf_counter()
+        value = function(*args)
+        timing = timings[name]
+        timing[0] += 1
+        timing[1] += time.perf_counter() - start
+        return value
+    return timed
+
+PROFILED_METHODS = ("getValidMoves", "makeMove", "undoMove") #GameState methods startProfiling times
+
+def startProfiling(gs, timings):
+    global scoreBoard
+    #the instance attributes hide the methods until stopProfiling deletes them again
+    for name in PROFILED_METHODS:
+        setattr(gs, name, timedFunction(getattr(gs, name), name, timings))
+    scoreBoard = timedFunction(untimedScoreBoard, "scoreBoard", timings)
+
+def stopProfiling(gs):
+    global scoreBoard
+    for name in PROFILED_METHODS:
+        delattr(gs, name)
+    scoreBoard = untimedScoreBoard
+
+#PARALLEL ROOT SEARCH
+#each depth the first root move is searched by the calling process to get a score to beat, then the other root
+#moves are handed out to a pool of processes, every process reads the best root score so far from shared memory
+#before it starts a move so the later moves are searched with a narrower window
+#the pool is kept for the whole game so each process keeps its transposition table, killer moves and history scores
+#the moves picked can differ from the single process search: every process has its own tables, and what null move
+#pruning, late move reductions and the tables cut depends on which positions a process happened to search before
+rootPool = None #pool of the parallel search, started the first time it is needed
+rootPoolWorkers = 0 #number of processes in rootPool
+rootPoolOwner = None #process id that started rootPool, a forked process gets a copy it can't use
+rootBestScore = None #multiprocessing Value with the best root score so far, for the side to move
+rootAbort = None #shared flag, set to 1 when the parallel search is out of time or stopped, every process then stops
+rootSearchCount = 0 #searches started by this process, tells the pool processes when the position changed
+rootGameState = None #in a pool process, its copy of the position being searched
+rootSearchID = None #in a pool process, the search rootGameState belongs to
+rootDepth = 0 #in a pool process, the depth it last searched
+
+def initRootWorker(bestScore, abort):
+    global rootBestScore, rootAbort
+    rootBestScore = bestScore
+    rootAbort = abort
+
+def getRootPool(workers):
+    global rootPool, rootPoolWorkers, rootPoolOwner, rootBestScore, rootAbort
+    if rootPool is None or rootPoolWorkers != workers or rootPoolOwner != os.getpid():
+        closeRootPool()
+        rootBestScore = Value('d', -CHECKMATE)
+        rootAbort = RawValue('b', 0)#only ever set, so it needs no lock
+        rootPool = Pool(workers, initializer=initRootWorker, initargs=(rootBestScore, rootAbort))
+        rootPoolWorkers = workers
+        rootPoolOwner = os.getpid()
+    return rootPool
+
+def closeRootPool():
+    global rootPool, rootAbort
+    if rootPool is not None and rootPoolOwner == os.getpid():
+        rootPool.terminate()
+        rootPool.join()
+    rootPool = None
+    rootAbort = None
+
+#searches one root move in a pool process, returns (moveID, score, alpha it was searched with, finished, nodes, searchStats)
+#task is (searchID, pickled game state, moveID, depth, deadline), the position is only unpickled once per search
+#deadline is a time.monotonic() value shared by every task, a task that starts after it or after the abort does nothing
+def searchRootMoveTask(task):
+    global rootGameState, rootSearchID, rootDepth
+    searchID, position, moveID, depth, deadline = task
+    if rootAbort.value or (deadline is not None and time.monotonic() >= deadline):
+        return moveID, 0, 0, False, 0, {}
+    if searchID != rootSearchID:#the first move of a new search this process gets
+        rootGameState = pickle.loads(position)
+        rootSearchID = searchID
+        rootDepth = 0
+        newOrderingSearch()
+    if depth != rootDepth:
+        transpositionTable.newSearch()
+        rootDepth = depth
+    for stat in searchStats:
+        searchStats[stat] = 0
+    alpha = rootBestScore.value
+    score, finished = searchRootMove(rootGameState, moveID, depth, alpha, deadline)
+    if finished:
+        with rootBestScore.get_lock():
+            if score > rootBestScore.value:
+                rootBestScore.value = score
+    return moveID, score, alpha, finished, nodesSearched, dict(searchStats)
+
+#score of one root move searched to depth, exact when it is above alpha, returns (score, finished)
+#deadline is the time.monotonic() value to stop at, None for no time limit
+def searchRootMove(gs, moveID, depth, alpha, deadline):
+    global nodesSearched, searchDeadline, searchAborted
+    nodesSearched = 0
+    searchDeadline = deadline
+    searchAborted = False
+    move = [move for move in gs.getValidMoves() if move.moveID == moveID][0]
+    turnMulitplier = 1 if gs.whiteToMove else -1
+    gs.makeMove(move)
+    score = -findMoveNegaMaxAlphaBeta(gs, gs.getValidMoves(), depth - 1, -CHECKMATE, -alpha, -turnMulitplier, 1)
+    gs.undoMove()
+    finished = not searchAborted
+    searchAborted = False
+    searchDeadline = None
+    return score, finished
+
+#yields the results of the root move tasks as they finish, while waiting it watches the deadline and the search
+#worker's pipe, once either says to stop it sets rootAbort so the running tasks stop and the waiting ones are skipped
+def waitForRootMoves(results, deadline):
+    while True:
+        try:
+            yield results.next(0.01)
+        except StopIteration:
+            break
+        except PoolTimeoutError:#nothing finished yet
+            pass
+        if (deadline is not None and time.monotonic() >= deadline) or \
+                (searchStopConnection is not None and searchStopConnection.poll()):
+            rootAbort.value = 1
+
+#iterative deepening with the root moves of every depth split across workers processes
+#fills in result (a SearchResult) when one is given, the node counts and searchStats of the pool processes are added in
+def parallelRootSearch(gs, validMoves, maxDepth, timeLimit, workers, result=None):
+    global rootSearchCount, nodesSearched
+    if result is None:
+        result = SearchResult()
+    deadline = time.monotonic() + timeLimit if timeLimit is not None else None
+    for stat in searchStats:
+        searchStats[stat] = 0
+    newOrderingSearch()
+    poolStats = dict.fromkeys(searchStats, 0)
+    moves = list(validMoves)
+    movesByID = {move.moveID: move for move in moves}
+    bestMove = None
+    pool = getRootPool(workers)
+    rootAbort.value = 0
+    rootSearchCount += 1
+    position = pickle.dumps(gs)
+    for depth in range(1, maxDepth + 1):
+        transpositionTable.newSearch()
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        depthStart = time.perf_counter()
+        #the best move of the last depth goes first and sets the score the others have to beat
+        score, finished = searchRootMove(gs, moves[0].moveID, depth, -CHECKMATE, deadline)
+        depthNodes = nodesSearched
+        result.nodes += nodesSearched
+        if not finished:
+            break
+        rootBestScore.value = score
+        results = [(score, 0, moves[0])]
+        allFinished = True
+        tasks = [(rootSearchCount, position, move.moveID, depth, deadline) for move in moves[1:]]
+        for moveID, score, alpha, finished, nodes, stats in waitForRootMoves(pool.imap_unordered(searchRootMoveTask, tasks), deadline):
+            depthNodes += nodes
+            result.nodes += nodes
+            for stat in stats:
+                poolStats[stat] += stats[stat]
+            if not finished:
+                allFinished = False
+            elif score > alpha:#at or below alpha the score is only an upper bound
+                results.append((score, moves.index(movesByID[moveID]), movesByID[moveID]))
+        #highest score, the earlier move in the list wins a tie
+        score, index, bestMove = max(results, key=lambda result: (result[0], -result[1]))
+        moves.remove(bestMove)
+        moves.insert(0, bestMove)
+        if allFinished:
+            result.addDepth(depth, score, depthNodes, time.perf_counter() - depthStart)
+        if not allFinished or abs(score) >= CHECKMATE:#out of time or a forced mate was found
+            break
+    rootAbort.value = 0#every task has returned, a later serial search in this process must not see the flag
+    for stat in poolStats:
+        searchStats[stat] += poolStats[stat]
+    nodesSearched = result.nodes
+    result.stats = dict(searchStats)
+    result.bestMove = bestMove
+    return bestMove
+
+#SEARCH WORKER
+#one process that does every AI search for the whole game, instead of a new process for each move
+#the transposition table, killer moves and history scores stay filled between moves, and the game state is
+#never pickled, the worker keeps its own copy in step from the moves that changed since the last search
+#messages sent to the worker:
+#  ("sync", undoCount, moveIDs) undo undoCount moves then play the moves with these ids
+#  ("new", fen)                 start again from a new position
+#  ("search", searchID, depth, timeLimit, nodeLimit)  search the current position, answers ("bestmove", searchID, moveID or None)
+#  ("stop",)                    stops the running search early, it still answers with the best move it has
+#  ("quit",)                    ends the process
+#uiConnection is the UI's end of the pipe, a forked worker has a copy of it that has to be closed
+def runSearchWorker(connection, fen, bitboardEngine, uiConnection=None):
+    global searchStopConnection
+    if uiConnection is not None:
+        uiConnection.close()
+    searchStopConnection = connection
+    gs = BitboardGameState(fen) if bitboardEngine else GameState(fen)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:#the UI process is gone
+            break
+        if message[0] == "sync":
+            for i in range(message[1]):
+                gs.undoMove()
+            for moveID in message[2]:
+                for move in gs.getValidMoves():
+                    if move.moveID == moveID:
+                        gs.makeMove(move)
+                        break
+        elif message[0] == "new":
+            gs = BitboardGameState(message[1]) if bitboardEngine else GameState(message[1])
+            clearSearchMemory()
+            closeRootPool()#the pool processes' tables are from the old game, a new pool starts with empty ones
+        elif message[0] == "search":
+            searchID, depth, timeLimit, nodeLimit = message[1:]
+            bestMove = searchBestMove(gs, gs.getValidMoves(), depth, timeLimit, nodeLimit)
+            connection.send(("bestmove", searchID, bestMove.moveID if bestMove is not None else None))
+        elif message[0] == "quit":
+            break
+        #a "stop" that arrives after the search already finished has nothing left to stop
+    closeRootPool()
+
+#the UI side of the search worker
+class SearchWorker():
+    def __init__(self, fen, bitboardEngine=BITBOARD_ENGINE):
+        self.connection, workerConnection = Pipe()
+        #not a daemon so it can start the parallel search pool, it ends by itself when the UI closes the pipe
+        #each side closes the other's end of the pipe, otherwise the worker would never see the UI's end close
+        self.process = Process(target=runSearchWorker, args=(workerConnection, fen, bitboardEngine, self.connection))
+        self.process.start()
+        workerConnection.close()
+        #multiprocessing waits for the worker when python exits, so it has to be told to quit before then
+        #even if close is never called, e.g. when the UI raises an exception
+        atexit.register(self.close)
+        self.moveIDs = [] #ids of the moves the worker has played from fen
+        self.searchID = 0 #answers to older searches are thrown away
+        self.searching = False
+
+    #start again from fen, e.g. when the board is reset
+    def newGame(self, fen):
+        self.stop()
+        self.connection.send(("new", fen))
+        self.moveIDs = []
+
+    #send the worker only the moves that differ from what it already played
+    def sync(self, gs):
+        gameMoveIDs = [move.moveID for move in gs.moveLog]
+        common = 0
+        while common < len(self.moveIDs) and common < len(gameMoveIDs) and self.moveIDs[common] == gameMoveIDs[common]:
+            common += 1
+        if common < len(self.moveIDs) or common < len(gameMoveIDs):
+            self.connection.send(("sync", len(self.moveIDs) - common, gameMoveIDs[common:]))
+            self.moveIDs = gameMoveIDs
+
+    #starts searching the position of gs without waiting for the answer
+    def startSearch(self, gs, depth=None, timeLimit=None, nodeLimit=None):
+        self.stop()
+        self.sync(gs)
+        self.searchID += 1
+        self.connection.send(("search", self.searchID, depth, timeLimit, nodeLimit))
+        self.searching = True
+
+    #the move from validMoves the search picked once it has finished, None while it is still searching
+    def getMove(self, validMoves):
+        while self.searching and self.connection.poll():
+            message = self.connection.recv()
+            if message[0] == "bestmove" and message[1] == self.searchID:
+                self.searching = False
+                for move in validMoves:
+                    if move.moveID == message[2]:
+                        return move
+                return findRandomMove(validMoves)#stopped before any move was searched
+        return None
+
+    #stop the running search, its answer will be ignored
+    def stop(self):
+        if self.searching:
+            self.connection.send(("stop",))
+            self.searchID += 1
+            self.searching = False
+
+    def close(self):
+        if self.connection.closed:
+            return
+        atexit.unregister(self.close)
+        self.stop()
+        try:
+            self.connection.send(("quit",))
+        except (BrokenPipeError, OSError):#the worker is already gone
+            pass
+        self.connection.close()
+        self.process.join(1)
+
 #positive score is good for white, negative score is good for white
 def scoreBoard(gs):
     if gs.checkMate:
@@ -687,22 +2400,19 @@ def scoreBoard(gs):
     elif gs.staleMate:
         return STALEMATE
 
+    #the material and position score is kept up to date by makeMove and undoMove
+    return gs.boardScore
+
+untimedScoreBoard = scoreBoard #startProfiling swaps scoreBoard for a timed version, this is the real one
+
+#material and position score of every piece on the board, the running total in GameState starts from this
+def scorePieces(board):
     score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
+    for row in range(len(board)):
+        for col in range(len(board[row])):
+            square = board[row][col]
             if square != "--":
-                #score it positionally
-                piecePositionScore = 0
-                if square[1] == "p" or square[1] == "R" or square[1] == "K" or square[1] == "B":
-                    piecePositionScore = piecePositionScores[square][row][col]
-                else: #for other pieces
-                    piecePositionScore = piecePositionScores[square[1]][row][col]
-                #add the positional score to the value of the piece to find the score of the move
-                if square[0] == 'w':
-                    score += pieceScores[square[1]] + piecePositionScore
-                elif square[0] == 'b':
-                    score -= pieceScores[square[1]] + piecePositionScore
+                score += PIECE_SQUARE_SCORES[square][row * 8 + col]
     return score
 
 #score board based on Material
@@ -715,6 +2425,45 @@ def scoreMaterial(board):
             elif square[0] == 'b':
                 score -= pieceScores[square[1]]
     return score
+
+#BATCH EVALUATION
+#scores many positions with one numpy call instead of one Python loop each, for offline analysis of large sets of positions
+#a board is encoded as 64 int8 piece codes (0 for an empty square), and the score of every square is looked up in a
+#(13, 64) table made from PIECE_SQUARE_SCORES, so the sums are the same as scorePieces and the running boardScore
+#the scores are all multiples of 0.5 so adding them up in a different order gives exactly the same floats
+PIECE_CODES = {"--": 0}
+PIECE_CODES.update((piece, i + 1) for i, piece in enumerate(PIECES))
+batchScoreTable = None #numpy version of PIECE_SQUARE_SCORES, row PIECE_CODES[piece] is that piece's table
+
+def importNumpy():
+    global np, batchScoreTable
+    if np is None:
+        import numpy
+        np = numpy
+    if batchScoreTable is None:
+        batchScoreTable = np.zeros((len(PIECE_CODES), 64), dtype=np.float64)
+        for piece in PIECES:
+            batchScoreTable[PIECE_CODES[piece]] = PIECE_SQUARE_SCORES[piece]
+
+#(N, 64) int8 array of the piece codes of N 8x8 boards, square row * 8 + col
+def encodeBoards(boards):
+    importNumpy()
+    codes = PIECE_CODES
+    return np.array([codes[square] for board in boards for row in board for square in row], dtype=np.int8).reshape(len(boards), 64)
+
+#material and position scores of an (N, 64) array from encodeBoards, the same as scorePieces of each board
+def scoreEncodedBoards(codes):
+    importNumpy()
+    return batchScoreTable[codes, np.arange(64)].sum(axis=1)
+
+#scoreBoard of every game state in a list, as a float64 array (positive is good for white)
+#checkMate and staleMate are only known after getValidMoves, the same as for scoreBoard
+def scoreBoards(gameStates):
+    scores = scoreEncodedBoards(encodeBoards([gs.board for gs in gameStates]))
+    for i, gs in enumerate(gameStates):
+        if gs.checkMate or gs.staleMate:
+            scores[i] = scoreBoard(gs)
+    return scores
 #End of Build AI
 #-------------------------------------------------------------------------------------------------------------------
 
@@ -725,16 +2474,20 @@ def loadImages():
     for piece in pieces:
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
 
-#talker is initializing for pyttsx3, so that we can annouce the move 
-talker =  pyttsx3.init()
+#talker is initializing for pyttsx3 in main(), so that we can annouce the move 
+talker = None
 def main():
+    global p, talker
+    import pygame as p
+    import pyttsx3
+    talker = pyttsx3.init()
 
     p.init()#initialize pygame
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT)) #make the window for the UI
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     moveLogFont = p.font.SysFont("Arial", 14, False, False)#the font for the moveLog
-    gs = GameState()#simplify for calling the gamestate class
+    gs = BitboardGameState() if BITBOARD_ENGINE else GameState()#simplify for calling the gamestate class
     validMoves = gs.getValidMoves()
     moveMade = False #flag variable for when a move is made
     animate = False #flag variable for when we should animate a move
@@ -747,106 +2500,107 @@ def main():
     playerTwo = False# same logic as above
     AIThinking = False #true when Ai is trying to come up with a move
     audio = True#flag for if you want audio or not, true is want audio
-    moveFinderProcess = None
+    moveFinder = SearchWorker(gs.getFen(), BITBOARD_ENGINE)#searches for the AI in another process so the UI doesn't freeze
     moveUndone = False
-    #main game loop
-    while running:
-        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
-        for e in p.event.get():
-            if e.type == p.QUIT:
-                running = False
-            #mouse handler
-            elif e.type == p.MOUSEBUTTONDOWN:
-                if not gameOver:
-                    location = p.mouse.get_pos()#(x,y) location of mouse
-                    col = location[0] // SQ_SIZE
-                    row = location[1] // SQ_SIZE
-                    if sqSelected == (row, col) or col >= 8:#the user clicked the same square twice or user clicked mouse log
+    try:
+        #main game loop
+        while running:
+            humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+            for e in p.event.get():
+                if e.type == p.QUIT:
+                    running = False
+                #mouse handler
+                elif e.type == p.MOUSEBUTTONDOWN:
+                    if not gameOver:
+                        location = p.mouse.get_pos()#(x,y) location of mouse
+                        col = location[0] // SQ_SIZE
+                        row = location[1] // SQ_SIZE
+                        if sqSelected == (row, col) or col >= 8:#the user clicked the same square twice or user clicked mouse log
+                            sqSelected = ()
+                            playerClicks =[]
+                        else:
+                            sqSelected = (row, col)
+                            playerClicks.append(sqSelected)#append for both 1st and 2nd clicks
+                        if len(playerClicks) == 2 and humanTurn:#after 2nd click
+                            move = Move(playerClicks[0], playerClicks[1], gs.board)
+                            #print(move.getChessNotation())
+                            for i in range(len(validMoves)):
+                                if move == validMoves[i]:
+                                    gs.makeMove(validMoves[i])
+                                    moveMade = True
+                                    animate = True
+                                    sqSelected = ()#reset
+                                    playerClicks = []
+                            if not moveMade:
+                                playerClicks = [sqSelected]
+                #key handler
+                elif e.type == p.KEYDOWN:#undo when z is pressed
+                    if e.key == p.K_z:
+                        gs.undoMove()
+                        moveMade = True
+                        animate = False
+                        gameOver = False
+                        if AIThinking:
+                            moveFinder.stop()
+                            AIThinking = False
+                        moveUndone = True
+                    if e.key == p.K_r:#reset the board when r is pressed
+                        gs = BitboardGameState() if BITBOARD_ENGINE else GameState()
+                        validMoves = gs.getValidMoves()
                         sqSelected = ()
-                        playerClicks =[]
-                    else:
-                        sqSelected = (row, col)
-                        playerClicks.append(sqSelected)#append for both 1st and 2nd clicks
-                    if len(playerClicks) == 2 and humanTurn:#after 2nd click
-                        move = Move(playerClicks[0], playerClicks[1], gs.board)
-                        #print(move.getChessNotation())
-                        for i in range(len(validMoves)):
-                            if move == validMoves[i]:
-                                gs.makeMove(validMoves[i])
-                                moveMade = True
-                                animate = True
-                                sqSelected = ()#reset
-                                playerClicks = []
-                        if not moveMade:
-                            playerClicks = [sqSelected]
-            #key handler
-            elif e.type == p.KEYDOWN:#undo when z is pressed
-                if e.key == p.K_z:
-                    gs.undoMove()
-                    moveMade = True
-                    animate = False
-                    gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
+                        playerClicks = []
+                        moveMade = False
+                        animate = False
+                        gameOver = False
+                        moveFinder.newGame(gs.getFen())
                         AIThinking = False
-                    moveUndone = True
-                if e.key == p.K_r:#reset the board when r is pressed
-                    gs = GameState()
-                    validMoves = gs.getValidMoves
-                    sqSelected = ()
-                    playerClicks = []
-                    moveMade = False
-                    animate = False
-                    gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
-                        AIThinking = False
-                    moveUndone = True
-
-        #AI move finder logic
-        if not gameOver and not humanTurn and not moveUndone:
-            if not AIThinking:
-                AIThinking = True
-                returnQueue = Queue()#used to pass data between threads
-                moveFinderProcess = Process(target=findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start()# cal findBestMove
-
-            if not moveFinderProcess.is_alive():
-                AIMove = returnQueue.get()
-                if AIMove is None:
-                    AIMove = findRandomMove(validMoves)
-                gs.makeMove(AIMove)
-                moveMade = True
-                animate = True
-                AIThinking = False
-        
-        if moveMade:
-            if animate:
-                animateMove(gs, gs.moveLog[-1], screen, gs.board, clock)
-            validMoves = gs.getValidMoves()
-            if audio:
-                #speak the last move out loud using talker
-                talker.say(gs.moveLog[-1])
-                talker.runAndWait()
-                talker.stop()
-            moveMade = False
-            animate = False
-            moveUndone = False
-
-        drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
+                        moveUndone = True
 
-        if gs.checkMate or gs.staleMate:
-            gameOver = True
-            drawEndGameText(screen, 'Stalemate' if gs.staleMate else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate')
-        elif not moveMade and (gs.inCheck()):#will highlight the kings current square in red while its in check
-            kingRow, kingCol = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color('red'))
-            screen.blit(s, (kingCol * SQ_SIZE, kingRow * SQ_SIZE))
-
-        clock.tick(MAX_FPS)
-        p.display.flip()
+            #AI move finder logic
+            if not gameOver and not humanTurn and not moveUndone:
+                if not AIThinking:
+                    AIThinking = True
+                    moveFinder.startSearch(gs)#only the moves since the last search are sent
+
+                AIMove = moveFinder.getMove(validMoves)
+                if AIMove is not None:
+                    gs.makeMove(AIMove)
+                    moveMade = True
+                    animate = True
+                    AIThinking = False
+        
+            if moveMade:
+                if animate:
+                    animateMove(gs, gs.moveLog[-1], screen, gs.board, clock)
+                validMoves = gs.getValidMoves()
+                if audio:
+                    #speak the last move out loud using talker
+                    talker.say(gs.moveLog[-1])
+                    talker.runAndWait()
+                    talker.stop()
+                moveMade = False
+                animate = False
+                moveUndone = False
+
+            drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
+
+            if gs.checkMate or gs.staleMate:
+                gameOver = True
+                drawEndGameText(screen, 'Stalemate' if gs.staleMate else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate')
+            elif gs.isRepetition() or gs.isFiftyMoveDraw():
+                gameOver = True
+                drawEndGameText(screen, 'Draw by repetition' if gs.isRepetition() else 'Draw by the fifty move rule')
+            elif not moveMade and (gs.inCheck()):#will highlight the kings current square in red while its in check
+                kingRow, kingCol = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
+                s = p.Surface((SQ_SIZE, SQ_SIZE))
+                s.set_alpha(100)
+                s.fill(p.Color('red'))
+                screen.blit(s, (kingCol * SQ_SIZE, kingRow * SQ_SIZE))
+
+            clock.tick(MAX_FPS)
+            p.display.flip()
+    finally:#the worker process has to be told to quit even when the UI crashes
+        moveFinder.close()
 
 #responsible for all the graphics within a current game state 
 def drawGameState(screen, gs , validMoves, sqSelected, moveLogFont):
@@ -0,0 +1,176 @@
+#batch analysis, searches a stream of positions across a pool of processes without the UI
+#every input line is a position, either a FEN string, a list of moves from the starting position like "e2e4 e7e5 g1f3",
+#or a JSON object {"id": ..., "fen": ..., "moves": [...], "time": seconds, "depth": plies} where every key is optional
+#results are written as one JSON line per position in the same order as the input
+#every "score" is positive when white is better, like scoreBoard, whichever side is to move
+#run "python ChessBatch.py games.txt --time 2 --workers 8 > results.jsonl"
+#or "python ChessBatch.py positions.txt --static" to only score every position with the evaluation (needs numpy)
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+from multiprocessing import Pool
+import Chess
+
+
+#turns one input line into a dictionary with the keys of the JSON form, None for a blank line
+def parsePositionLine(line):
+    line = line.strip()
+    if line == "":
+        return None
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except ValueError as error:
+            return {"error": "Invalid JSON: " + str(error)}#reported in its place in the output
+    if "/" in line:
+        return {"fen": line}
+    return {"moves": line.split()}
+
+#builds the game state of a position, moves are played from the fen (or the starting position) with makeMove
+def loadPosition(position, bitboardEngine=True):
+    gameStateClass = Chess.BitboardGameState if bitboardEngine else Chess.GameState
+    gs = gameStateClass(position.get("fen"))
+    for notation in position.get("moves", []):
+        for move in gs.getValidMoves():
+            if move.getChessNotation() == notation:
+                gs.makeMove(move)
+                break
+        else:
+            raise ValueError("Illegal move " + notation + " in position " + gs.getFen())
+    return gs
+
+#pool processes can't start processes of their own, so each one searches on a single core
+def initBatchWorker():
+    Chess.PARALLEL_WORKERS = 1
+
+#the depth and time limit of a position, its own "depth" and "time" or the defaults, raises ValueError if they aren't numbers
+def getSearchLimits(position, timeLimit, depth):
+    depth = position.get("depth", depth)
+    timeLimit = position.get("time", timeLimit)
+    if depth is not None and (type(depth) is not int or depth < 1):
+        raise ValueError("Invalid depth %r, it has to be a whole number of plies above 0" % (depth,))
+    if timeLimit is not None and (type(timeLimit) not in (int, float) or timeLimit <= 0):
+        raise ValueError("Invalid time %r, it has to be a number of seconds above 0" % (timeLimit,))
+    return timeLimit, depth
+
+#searches one position and returns its result dictionary, anything that goes wrong is reported in its "error"
+#task is (index, position, default time limit, default depth, bitboardEngine)
+def analyzePosition(task):
+    index, position, timeLimit, depth, bitboardEngine = task
+    result = {"index": index}
+    if "id" in position:
+        result["id"] = position["id"]
+    if "error" in position:
+        result["error"] = position["error"]
+        return result
+    try:
+        searchPositionInto(result, position, timeLimit, depth, bitboardEngine)
+    except Exception as error:#one bad position must not stop the rest of the batch
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+    return result
+
+#does the work of analyzePosition, filling in result
+def searchPositionInto(result, position, timeLimit, depth, bitboardEngine):
+    timeLimit, depth = getSearchLimits(position, timeLimit, depth)
+    gs = loadPosition(position, bitboardEngine)
+    result["fen"] = gs.getFen()
+    validMoves = gs.getValidMoves()
+    if len(validMoves) == 0:
+        result["bestMove"] = None
+        result["gameOver"] = "checkmate" if gs.checkMate else "stalemate"
+        return
+    search = Chess.searchPosition(gs, validMoves, depth, timeLimit)
+    bestMove = search.bestMove
+    if bestMove is None:#stopped before a single move was searched
+        bestMove = Chess.findRandomMove(validMoves)
+    result["bestMove"] = bestMove.getChessNotation()
+    result["move"] = str(bestMove)
+    result["score"] = search.score if gs.whiteToMove else -search.score#the search scores for the side to move
+    result["depth"] = search.depth
+    result["source"] = search.source
+    result["pv"] = [move.getChessNotation() for move in search.principalVariation]
+    result["nodes"] = search.nodes
+    result["seconds"] = round(search.elapsed, 3)
+    result["nps"] = round(search.nodesPerSecond())
+
+#searches every position on a pool of workers processes, yields the result dictionaries in input order as they finish
+#timeLimit and depth are the defaults for positions that don't give their own, with neither the AI's DEPTH is used
+#only PENDING_PER_WORKER positions per process are read ahead, so a long input is streamed instead of read all at once
+PENDING_PER_WORKER = 4
+
+def analyzePositions(positions, workers=None, timeLimit=None, depth=None, bitboardEngine=True):
+    workers = workers or os.cpu_count() or 1
+    pending = collections.deque()
+    with Pool(workers, initializer=initBatchWorker) as pool:
+        for index, position in enumerate(positions):
+            pending.append(pool.apply_async(analyzePosition, ((index, position, timeLimit, depth, bitboardEngine),)))
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+#scores every position with the evaluation alone, chunkSize positions at a time in one numpy call
+#yields {"index", "id", "fen", "score"} dictionaries in input order, the score is positive when white is better
+def evaluatePositions(positions, bitboardEngine=True, chunkSize=4096):
+    positions = enumerate(positions)
+    while True:
+        chunk = list(itertools.islice(positions, chunkSize))
+        if len(chunk) == 0:
+            break
+        results = []
+        gameStates = []
+        for index, position in chunk:
+            result = {"index": index}
+            if "id" in position:
+                result["id"] = position["id"]
+            results.append(result)
+            if "error" in position:
+                result["error"] = position["error"]
+                continue
+            try:
+                gs = loadPosition(position, bitboardEngine)
+                gs.getValidMoves()#sets checkMate and staleMate
+            except Exception as error:#one bad position must not stop the rest of the batch
+                result["error"] = "%s: %s" % (type(error).__name__, error)
+                continue
+            result["fen"] = gs.getFen()
+            gameStates.append((result, gs))
+        scores = Chess.scoreBoards([gs for result, gs in gameStates])
+        for (result, gs), score in zip(gameStates, scores.tolist()):
+            result["score"] = score
+        for result in results:
+            yield result
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best move of many positions and write the results as JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="file with one position per line, - for standard input")
+    parser.add_argument("--output", default="-", help="file to write the results to, - for standard output")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, the number of CPUs by default")
+    parser.add_argument("--time", type=float, default=None, help="seconds to search each position")
+    parser.add_argument("--depth", type=int, default=None, help="plies to search each position")
+    parser.add_argument("--mailbox", action="store_true", help="use the 8x8 board GameState instead of the bitboard one")
+    parser.add_argument("--static", action="store_true", help="only score the positions with the evaluation, no search")
+    args = parser.parse_args()
+
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = sys.stdout if args.output == "-" else open(args.output, "w")
+    positions = (position for position in (parsePositionLine(line) for line in inputFile) if position is not None)
+    if args.static:
+        results = evaluatePositions(positions, not args.mailbox)
+    else:
+        results = analyzePositions(positions, args.workers, args.time, args.depth, not args.mailbox)
+    for result in results:
+        outputFile.write(json.dumps(result) + "\n")
+        outputFile.flush()#stream each result out as soon as it is ready
+    if inputFile is not sys.stdin:
+        inputFile.close()
+    if outputFile is not sys.stdout:
+        outputFile.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#search benchmark, runs the AI on a fixed set of positions with a seeded random number generator so every run searches
+#the same tree, and compares the nodes, time and chosen move against a stored baseline so a slower or bigger search is noticed
+#the opening book, tablebases and parallel search are turned off, and the search memory is cleared before every position
+#run "python ChessBenchmark.py --depth 4 --save baseline.json" once, then "python ChessBenchmark.py --baseline baseline.json"
+import argparse
+import json
+import statistics
+import sys
+import time
+import Chess
+
+#(name, fen) of tactical positions with a capture, check or mate to find and quiet positions without one
+BENCHMARK_SUITE = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("queens gambit", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("back rank mate", "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1"),
+    ("knight fork", "r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1"),
+    ("hanging queen", "rnb1kbnr/pppp1ppp/8/4p1q1/4P3/3P4/PPP2PPP/RNBQKBNR w KQkq - 1 3"),
+    ("rook endgame", "8/5pk1/6p1/8/3R4/6P1/5PKP/r7 b - - 0 1"),
+    ("pawn endgame", "8/8/4k3/8/2p5/8/2KP4/8 w - - 0 1"),
+]
+
+ALGORITHMS = ["alphabeta", "negamax", "minmax"]
+BACKENDS = {"mailbox": Chess.GameState, "bitboard": Chess.BitboardGameState}
+TIME_NOISE = 0.1 #seconds a search can be slower than its baseline without being a regression, short searches vary a lot
+REPEAT = 3 #runs of every search by default, the median time is kept
+
+
+#searches one position with one algorithm, returns (best move, nodes, seconds)
+#alphabeta is the AI's own search, negamax and minmax are the plain searches without pruning for comparison
+def runSearch(algorithm, gs, depth, seed):
+    Chess.searchRandom.seed(seed)
+    Chess.clearSearchMemory()
+    validMoves = gs.getValidMoves()
+    start = time.perf_counter()
+    if algorithm == "alphabeta":
+        result = Chess.searchPosition(gs, validMoves, depth)
+        return result.bestMove, result.nodes, time.perf_counter() - start
+    Chess.searchRandom.shuffle(validMoves)#the same move order searchPosition would start from
+    Chess.nextMove = None
+    Chess.nodesSearched = 0
+    savedDepth = Chess.DEPTH
+    Chess.DEPTH = depth#the plain searches pick their move at the ply where depth == DEPTH
+    try:
+        if algorithm == "negamax":
+            Chess.findMoveNegaMax(gs, validMoves, depth, 1 if gs.whiteToMove else -1)
+        else:
+            Chess.findMoveMinMax(gs, validMoves, depth, gs.whiteToMove)
+    finally:
+        Chess.DEPTH = savedDepth
+    return Chess.nextMove, Chess.nodesSearched, time.perf_counter() - start
+
+#runs every suite position with every algorithm, the time kept is the median of repeat runs
+#returns the baseline dictionary, printing a line per result as it goes
+def runBenchmark(algorithms, backend, depth, seed, repeat=REPEAT):
+    Chess.BOOK_FILE = None
+    Chess.TABLEBASE_DIR = None
+    Chess.PARALLEL_WORKERS = 1
+    results = []
+    for algorithm in algorithms:
+        for name, fen in BENCHMARK_SUITE:
+            times = []
+            for run in range(max(repeat, 1)):
+                bestMove, nodes, runSeconds = runSearch(algorithm, BACKENDS[backend](fen), depth, seed)
+                times.append(runSeconds)
+            seconds = statistics.median(times)
+            result = {"algorithm": algorithm, "position": name, "move": bestMove.getChessNotation() if bestMove is not None else None,
+                      "nodes": nodes, "seconds": round(seconds, 4), "nps": round(nodes / seconds) if seconds > 0 else 0}
+            results.append(result)
+            print("%-10s %-16s %-6s %9d nodes  %7.3fs  %8d nps" % (algorithm, name, result["move"], nodes, seconds, result["nps"]))
+    return {"depth": depth, "seed": seed, "backend": backend, "python": sys.version.split()[0], "results": results}
+
+#lines describing every result that got worse than in the baseline, an empty list when nothing did
+#nodes and the move should be identical on a repeatable search, the time is allowed timeTolerance (0.25 is 25%) or TIME_NOISE of noise
+def findRegressions(baseline, current, timeTolerance=0.25, nodeTolerance=0.0):
+    regressions = []
+    if (baseline["depth"], baseline["seed"], baseline["backend"]) != (current["depth"], current["seed"], current["backend"]):
+        regressions.append("baseline was made with depth %d, seed %d, %s backend, not depth %d, seed %d, %s backend" %
+                           (baseline["depth"], baseline["seed"], baseline["backend"], current["depth"], current["seed"], current["backend"]))
+        return regressions
+    oldResults = {(result["algorithm"], result["position"]): result for result in baseline["results"]}
+    for result in current["results"]:
+        old = oldResults.get((result["algorithm"], result["position"]))
+        if old is None:
+            continue
+        label = "%s %s" % (result["algorithm"], result["position"])
+        if result["nodes"] > old["nodes"] * (1 + nodeTolerance):
+            regressions.append("%s: %d nodes, baseline %d (%+.1f%%)" % (label, result["nodes"], old["nodes"], 100.0 * (result["nodes"] - old["nodes"]) / max(old["nodes"], 1)))
+        if result["seconds"] > old["seconds"] * (1 + timeTolerance) and result["seconds"] > old["seconds"] + TIME_NOISE:
+            regressions.append("%s: %.3fs, baseline %.3fs (%+.1f%%)" % (label, result["seconds"], old["seconds"], 100.0 * (result["seconds"] - old["seconds"]) / max(old["seconds"], 1e-9)))
+        if result["move"] != old["move"]:
+            regressions.append("%s: plays %s, baseline played %s" % (label, result["move"], old["move"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI search on a fixed set of positions")
+    parser.add_argument("--depth", type=int, default=3, help="plies to search each position")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random move shuffling")
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=["alphabeta"], help="searches to run, negamax and minmax are very slow past depth 3")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="bitboard", help="which GameState to use")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs of each search, the median time is kept")
+    parser.add_argument("--save", help="write the results to this JSON file as the new baseline")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to check the results against")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="how much slower than the baseline a search can be, 0.25 is 25%%")
+    parser.add_argument("--node-tolerance", type=float, default=0.0, help="how many more nodes than the baseline a search can use")
+    args = parser.parse_args()
+
+    current = runBenchmark(args.algorithms, args.backend, args.depth, args.seed, args.repeat)
+    totalNodes = sum(result["nodes"] for result in current["results"])
+    totalSeconds = sum(result["seconds"] for result in current["results"])
+    print("total %d nodes in %.2fs (%.0f nps)" % (totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds > 0 else 0))
+    if args.save:
+        with open(args.save, "w") as baselineFile:
+            json.dump(current, baselineFile, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            regressions = findRegressions(json.load(baselineFile), current, args.time_tolerance, args.node_tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        print("no regressions" if len(regressions) == 0 else "%d regressions" % len(regressions))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#builds the opening book the AI reads (Chess.BOOK_FILE) from games in PGN files
+#every position in the first plies of every game gets a record for the move played, weighted by how many games played it
+#run "python ChessBook.py games.pgn more_games.pgn --output book.bin --plies 16"
+import argparse
+import sys
+import Chess
+
+
+#splits PGN text into games, returns a list with the move text of each game
+def readPgnGames(text):
+    games = []
+    moveText = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("["):#tag pair, a new game starts with its tags
+            if moveText:
+                games.append("\n".join(moveText))
+                moveText = []
+        elif line != "" and not line.startswith("%"):
+            moveText.append(line)
+    if moveText:
+        games.append("\n".join(moveText))
+    return games
+
+#the SAN moves of one game's move text, without comments, variations, move numbers, annotations or the result
+def pgnMoveTokens(moveText):
+    tokens = []
+    token = ""
+    commentDepth = 0 #inside {...}
+    variationDepth = 0 #inside (...), variations can be nested
+    lineComment = False #; comments run to the end of the line
+    for char in moveText + " ":
+        if lineComment:
+            lineComment = char != "\n"
+            continue
+        if commentDepth > 0:
+            if char == "}":
+                commentDepth -= 1
+            continue
+        if char == "{":
+            commentDepth += 1
+        elif char == "(":
+            variationDepth += 1
+        elif char == ")":
+            variationDepth -= 1
+        elif char == ";":
+            lineComment = True
+        elif variationDepth == 0 and not char.isspace():
+            token += char
+            continue
+        if token:
+            tokens.append(token)
+            token = ""
+    moves = []
+    for token in tokens:
+        token = token.split(".")[-1]#"1.e4" and "1...e5" have the move number stuck to the move
+        if token == "" or token.startswith("$") or token in ("1-0", "0-1", "1/2-1/2", "*"):
+            continue
+        moves.append(token)
+    return moves
+
+#the Move in validMoves a SAN string like "Nbd7", "exd5", "O-O" or "e8=Q+" stands for, None if there isn't exactly one
+def parseSan(san, validMoves):
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endCol = 6 if len(san) == 3 else 2
+        for move in validMoves:
+            if move.isCastleMove and move.endCol == endCol:
+                return move
+        return None
+    if "=" in san:
+        san, promotion = san.split("=", 1)
+        if promotion[:1] != "Q":#the engine only promotes to a queen
+            return None
+    piece = san[0] if san[0] in "KQRBN" else 'p'
+    body = (san[1:] if piece != 'p' else san).replace("x", "").replace("-", "")
+    if len(body) < 2 or body[-2] not in Chess.Move.filesToCols or body[-1] not in Chess.Move.ranksToRows:
+        return None
+    endRow = Chess.Move.ranksToRows[body[-1]]
+    endCol = Chess.Move.filesToCols[body[-2]]
+    candidates = []
+    for move in validMoves:
+        if move.pieceMoved[1] != piece or move.endRow != endRow or move.endCol != endCol or move.isCastleMove:
+            continue
+        #the characters before the square tell pieces that can reach the same square apart
+        if all((char in Chess.Move.filesToCols and move.startCol == Chess.Move.filesToCols[char]) or
+               (char in Chess.Move.ranksToRows and move.startRow == Chess.Move.ranksToRows[char]) for char in body[:-2]):
+            candidates.append(move)
+    return candidates[0] if len(candidates) == 1 else None
+
+#{(position key, move id): number of games} for the first plies of every game
+def countBookMoves(games, plies):
+    counts = {}
+    for moveText in games:
+        gs = Chess.BitboardGameState()
+        for san in pgnMoveTokens(moveText)[:plies]:
+            move = parseSan(san, gs.getValidMoves())
+            if move is None:#unreadable or an under promotion, the rest of the game can't be followed
+                break
+            entry = (gs.zobristKey, move.moveID)
+            counts[entry] = counts.get(entry, 0) + 1
+            gs.makeMove(move)
+    return counts
+
+#writes the records sorted by position key so the AI can binary search the file, returns the number of records
+def writeBook(counts, path, minGames=1):
+    records = sorted((key, moveID, min(count, 0xFFFF)) for (key, moveID), count in counts.items() if count >= minGames)
+    with open(path, "wb") as bookFile:
+        for record in records:
+            bookFile.write(Chess.BOOK_RECORD.pack(*record))
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the opening book from PGN files")
+    parser.add_argument("pgn", nargs="+", help="PGN files to read the games from")
+    parser.add_argument("--output", default=Chess.BOOK_FILE or "book.bin", help="book file to write")
+    parser.add_argument("--plies", type=int, default=16, help="number of moves (plies) from the start of every game to keep")
+    parser.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games than this")
+    args = parser.parse_args()
+
+    games = []
+    for path in args.pgn:
+        with open(path, encoding="utf-8", errors="replace") as pgnFile:
+            games.extend(readPgnGames(pgnFile.read()))
+    records = writeBook(countBookMoves(games, args.plies), args.output, args.min_games)
+    print("%d games, %d book moves written to %s" % (len(games), records, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#perft (performance test) for the move generators in Chess.py
+#counts every leaf of the move tree to a fixed depth, the counts are checked against known results so a bug in
+#castling, en passant, promotion or makeMove/undoMove shows up as a wrong number, and the time gives a nodes per second
+#run "python ChessPerft.py --suite" for the regression suite or "python ChessPerft.py --depth 4 --divide" for one position
+import argparse
+import sys
+import time
+import Chess
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+#(name, fen, {depth: leaf count}) for the standard test positions
+#the engine only promotes to a queen, so positions with promotions use counts with the rook, bishop and knight promotions taken out
+PERFT_SUITE = [
+    ("start", START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", {1: 48, 2: 2039, 3: 97862}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", {1: 6, 2: 228}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", {1: 41}),
+    ("discovered check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1438912}),
+    ("en passant pin", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1132035}),
+    ("kingside castle", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    ("queenside castle", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    ("castle through check", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    ("castling rights lost", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    ("double check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+]
+
+BACKENDS = {"mailbox": Chess.GameState, "bitboard": Chess.BitboardGameState}
+
+
+#number of leaves depth moves ahead using the legal move generator
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth == 1:#the leaves are just counted, not made
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+#the same count using the pseudo-legal generator, moves that leave the king in check are thrown away after they are made
+def pseudoPerft(gs, depth):
+    moves = gs.getAllPossibleMoves()
+    if not gs.inCheck():
+        kingRow, kingCol = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
+        gs.getCastleMoves(kingRow, kingCol, moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        gs.whiteToMove = not gs.whiteToMove#look at the king of the side that just moved
+        legal = not gs.inCheck()
+        gs.whiteToMove = not gs.whiteToMove
+        if legal:
+            nodes += 1 if depth == 1 else pseudoPerft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+#leaf count below every root move, for finding which move a wrong count comes from
+def divide(gs, depth):
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move.getChessNotation(), 1 if depth == 1 else perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+#runs countFunction and returns (nodes, seconds, nodes per second)
+def timePerft(countFunction, gs, depth):
+    start = time.perf_counter()
+    nodes = countFunction(gs, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+#checks every suite position up to maxDepth with every backend, prints each result and returns the number of failures
+def runSuite(backends, maxDepth):
+    failures = 0
+    for backendName in backends:
+        for name, fen, counts in PERFT_SUITE:
+            for depth in sorted(counts):
+                if depth > maxDepth:
+                    continue
+                nodes, seconds, nps = timePerft(perft, BACKENDS[backendName](fen), depth)
+                passed = nodes == counts[depth]
+                failures += not passed
+                print("%-8s %-22s depth %d  %10d nodes  expected %10d  %s  %7.2fs  %9.0f nps" % (backendName, name, depth, nodes, counts[depth], "ok  " if passed else "FAIL", seconds, nps))
+    return failures
+
+#nodes per second of the legal generator against the pseudo-legal one on the same position
+def benchmark(backends, fen, depth):
+    for backendName in backends:
+        for label, countFunction in (("legal", perft), ("pseudo-legal", pseudoPerft)):
+            nodes, seconds, nps = timePerft(countFunction, BACKENDS[backendName](fen), depth)
+            print("%-8s %-12s depth %d  %10d nodes  %7.2fs  %9.0f nps" % (backendName, label, depth, nodes, seconds, nps))
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time the move tree of a position")
+    parser.add_argument("--fen", default=START_FEN, help="position to count, the starting position by default")
+    parser.add_argument("--depth", type=int, default=3, help="number of moves ahead to count")
+    parser.add_argument("--backend", choices=["mailbox", "bitboard", "both"], default="both", help="which GameState to use")
+    parser.add_argument("--divide", action="store_true", help="print the count below every root move")
+    parser.add_argument("--suite", action="store_true", help="check the known counts of the test positions up to --depth")
+    parser.add_argument("--bench", action="store_true", help="compare the legal and pseudo-legal generators")
+    args = parser.parse_args()
+    backends = ["mailbox", "bitboard"] if args.backend == "both" else [args.backend]
+
+    if args.suite:
+        failures = runSuite(backends, args.depth)
+        print("all counts match" if failures == 0 else "%d counts do not match" % failures)
+        return 1 if failures else 0
+    if args.bench:
+        benchmark(backends, args.fen, args.depth)
+        return 0
+    for backendName in backends:
+        gs = BACKENDS[backendName](args.fen)
+        if args.divide:
+            total = 0
+            for notation, nodes in divide(gs, args.depth):
+                print("%s: %d" % (notation, nodes))
+                total += nodes
+            print("%s total: %d" % (backendName, total))
+        else:
+            nodes, seconds, nps = timePerft(perft, gs, args.depth)
+            print("%s depth %d: %d nodes in %.2fs (%.0f nps)" % (backendName, args.depth, nodes, seconds, nps))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
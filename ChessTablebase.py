@@ -0,0 +1,151 @@
+#generates the endgame tablebases the AI reads (Chess.TABLEBASE_MATERIAL) by retrograde analysis
+#starts from every position where black is checkmated and works backwards one ply at a time:
+#a white to move position is won as soon as one move reaches a lost black position, a black to move position
+#is lost once every one of its moves reaches a won white position, whatever is never reached is a draw
+#run "python ChessTablebase.py" to write KQK, KRK and KPK into Chess.TABLEBASE_DIR
+import argparse
+import os
+import sys
+import time
+import Chess
+
+#squares are row * 8 + col like everywhere else in the engine
+KING_SQUARES = [[r * 8 + c for r, c in targets] for targets in Chess.KING_TARGETS]
+ROOK_RAYS = [[[r * 8 + c for r, c in ray] for ray in rays] for rays in Chess.ROOK_RAY_TARGETS]
+QUEEN_RAYS = [[[r * 8 + c for r, c in ray] for ray in rays] for rays in Chess.RAY_TARGETS]
+
+
+def kingsTouch(a, b):
+    return abs((a >> 3) - (b >> 3)) <= 1 and abs((a & 7) - (b & 7)) <= 1
+
+#True if the white piece on pieceSquare attacks target, blocker is the white king which sliding pieces can't see through
+def pieceAttacks(pieceType, pieceSquare, target, blocker):
+    if pieceType == 'p':
+        return (pieceSquare >> 3) - 1 == target >> 3 and abs((pieceSquare & 7) - (target & 7)) == 1
+    for ray in (QUEEN_RAYS if pieceType == 'Q' else ROOK_RAYS)[pieceSquare]:
+        for square in ray:
+            if square == target:
+                return True
+            if square == blocker:
+                break
+    return False
+
+#a legal placement, the side that isn't moving can't be in check and pawns can't stand on the end rows
+def isLegal(pieceType, whiteKing, blackKing, pieceSquare, whiteToMove):
+    if whiteKing == blackKing or pieceSquare == whiteKing or pieceSquare == blackKing or kingsTouch(whiteKing, blackKing):
+        return False
+    if pieceType == 'p' and (pieceSquare >> 3 == 0 or pieceSquare >> 3 == 7):
+        return False
+    return not (whiteToMove and pieceAttacks(pieceType, pieceSquare, blackKing, whiteKing))
+
+#squares the black king can move to, taking the white piece when it isn't defended is a move too
+def blackKingMoves(pieceType, whiteKing, blackKing, pieceSquare):
+    moves = []
+    for square in KING_SQUARES[blackKing]:
+        if square == whiteKing or kingsTouch(square, whiteKing):
+            continue
+        if square != pieceSquare and pieceAttacks(pieceType, pieceSquare, square, whiteKing):
+            continue
+        moves.append(square)
+    return moves
+
+#white to move positions that can reach (whiteKing, blackKing, pieceSquare) with black to move in one white move
+def whitePredecessors(pieceType, whiteKing, blackKing, pieceSquare):
+    positions = []
+    for square in KING_SQUARES[whiteKing]:#the white king came from next door
+        if square != blackKing and square != pieceSquare and not kingsTouch(square, blackKing):
+            positions.append((square, pieceSquare))
+    if pieceType == 'p':#the pawn came from one row down, or two from its starting row
+        below = pieceSquare + 8
+        if pieceSquare >> 3 < 6 and below != whiteKing and below != blackKing:
+            positions.append((whiteKing, below))
+            if pieceSquare >> 3 == 4 and below + 8 != whiteKing and below + 8 != blackKing:
+                positions.append((whiteKing, below + 8))
+    else:#sliding pieces move the same way backwards
+        for ray in (QUEEN_RAYS if pieceType == 'Q' else ROOK_RAYS)[pieceSquare]:
+            for square in ray:
+                if square == whiteKing or square == blackKing:
+                    break
+                positions.append((whiteKing, square))
+    return [Chess.tablebaseIndex(wk, blackKing, ps, True) for wk, ps in positions if isLegal(pieceType, wk, blackKing, ps, True)]
+
+#solves one material set, promotions in KPK are looked up in the solved KQK table (queenTable)
+#returns a bytearray with one value per tablebaseIndex, laid out the way Chess.probeTablebase reads it
+def generateTable(material, queenTable=None):
+    pieceType = material[1] if material[1] != 'P' else 'p'
+    values = bytearray(Chess.TABLEBASE_SIZE)
+    movesLeft = {} #black to move positions not yet lost, with the number of their moves not yet known to lose
+    levels = {0: []} #plies to mate -> positions first solved at that distance
+    promotions = {} #plies to mate -> white to move positions that win at that distance by promoting
+    for whiteKing in range(64):
+        for blackKing in range(64):
+            for pieceSquare in range(64):
+                if not isLegal(pieceType, whiteKing, blackKing, pieceSquare, False):
+                    continue
+                moves = blackKingMoves(pieceType, whiteKing, blackKing, pieceSquare)
+                index = Chess.tablebaseIndex(whiteKing, blackKing, pieceSquare, False)
+                if len(moves) == 0:
+                    if pieceAttacks(pieceType, pieceSquare, blackKing, whiteKing):#checkmate
+                        values[index] = 1
+                        levels[0].append(index)
+                elif pieceSquare not in moves:#black can always draw by taking the piece
+                    movesLeft[index] = len(moves)
+                #a pawn on the 7th row can promote, that white to move position wins if the queen position does
+                if pieceType == 'p' and pieceSquare >> 3 == 1 and pieceSquare - 8 != whiteKing and pieceSquare - 8 != blackKing and \
+                        isLegal(pieceType, whiteKing, blackKing, pieceSquare, True):
+                    queenValue = queenTable[Chess.tablebaseIndex(whiteKing, blackKing, pieceSquare - 8, False)]
+                    if queenValue > 0:
+                        promotions.setdefault(queenValue, []).append(Chess.tablebaseIndex(whiteKing, blackKing, pieceSquare, True))
+
+    plies = 0
+    while levels or promotions:
+        solved = levels.pop(plies, [])
+        for index in promotions.pop(plies, []):#unless a quicker win was already found
+            if values[index] == 0:
+                values[index] = plies + 1
+                solved.append(index)
+        nextLevel = []
+        for index in solved:
+            whiteToMove = index & 1 == 0
+            pieceSquare = (index >> 1) & 63
+            blackKing = (index >> 7) & 63
+            whiteKing = index >> 13
+            if not whiteToMove:#black is lost here, so every white move into this position wins
+                for previous in whitePredecessors(pieceType, whiteKing, blackKing, pieceSquare):
+                    if values[previous] == 0:
+                        values[previous] = plies + 2
+                        nextLevel.append(previous)
+            else:#white wins here, black positions whose last escape was this move are lost
+                for square in KING_SQUARES[blackKing]:
+                    previous = Chess.tablebaseIndex(whiteKing, square, pieceSquare, False)
+                    if previous in movesLeft and values[previous] == 0:
+                        movesLeft[previous] -= 1
+                        if movesLeft[previous] == 0:
+                            values[previous] = plies + 2
+                            nextLevel.append(previous)
+        if nextLevel:
+            levels[plies + 1] = nextLevel
+        plies += 1
+        if plies >= 254:
+            raise ValueError(material + " has a mate too long to store in one byte")
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the endgame tablebases")
+    parser.add_argument("--output", default=Chess.TABLEBASE_DIR or "tablebases", help="folder to write the tables to")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    tables = {}
+    for material in ("KQK", "KRK", "KPK"):#KPK promotes into KQK so KQK comes first
+        start = time.perf_counter()
+        tables[material] = generateTable(material, tables.get("KQK"))
+        with open(os.path.join(args.output, material + ".tb"), "wb") as tableFile:
+            tableFile.write(tables[material])
+        wins = sum(1 for value in tables[material] if value > 0)
+        print("%s: %d won positions, longest mate %d plies, %.1fs" % (material, wins, max(tables[material]) - 1, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())